@@ -146,8 +146,8 @@ class EasyDeLBaseConfig(PretrainedConfig):
 	  axis_dims (tp.Sequence[int]): Dimensions of the axes. Default is (1, -1, 1, 1).
 	  axis_names (tp.Sequence[str]): Names of the axes. Default is ("dp", "fsdp", "tp", "sp").
 	  attn_mechanism (AVAILABLE_ATTENTION_MECHANISMS): Attention mechanism to use. Default is DEFAULT_ATTENTION_MECHANISM.
-	  blocksize_k (int): Block size for key. Default is 128.
-	  blocksize_q (int): Block size for query. Default is 128.
+	  blocksize_k (int): Block size for key. Default is 128; `None` lets splash attention autotune it.
+	  blocksize_q (int): Block size for query. Default is 128; `None` lets splash attention autotune it.
 	  blocksize_b (int): Block size for batch. Default is 1.
 	  partition_axis (PartitionAxis): Partition axis configuration. Default is PartitionAxis().
 	  shard_attention_computation (bool): Whether to shard attention computation. Default is True.
@@ -819,6 +819,7 @@ class EasyDeLBaseConfig(PretrainedConfig):
 		head_size: tp.Optional[int] = None,
 		rotary_dim: tp.Optional[int] = None,
 		base: tp.Optional[float] = None,
+		dtype: tp.Optional[jnp.dtype] = None,
 	) -> ModuleCaches:
 		"""
 		Get basic frequencies for rotary embeddings.
@@ -827,6 +828,7 @@ class EasyDeLBaseConfig(PretrainedConfig):
 		    head_size: Size of attention heads (defaults to self.head_dim)
 		    rotary_dim: Dimension for rotary embeddings (defaults to head_size)
 		    base: Base value for frequency computation (defaults to self.rope_theta)
+		    dtype: Storage dtype of the table (defaults to float32); computed in float32
 
 		Returns:
 		    ModuleCaches instance containing computed frequencies
@@ -845,6 +847,7 @@ class EasyDeLBaseConfig(PretrainedConfig):
 			max_position=self.granted_freq_max_position_embedding,
 			base=base or self.rope_theta,
 			rope_scaling=rope_config.to_dict(),
+			dtype=dtype,
 		)
 
 		return ModuleCaches(frequencies)
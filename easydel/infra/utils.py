@@ -14,12 +14,13 @@
 
 import functools
 import inspect
+import math
 import re
 import types
 import typing as tp
 import warnings
 from contextlib import contextmanager
-from functools import lru_cache, partial
+from functools import lru_cache
 from typing import List, Set
 
 import flax
@@ -56,16 +57,28 @@ def quick_gelu(x):
 	return x * jax.nn.sigmoid(1.702 * x)
 
 
+def gelu_exact(x):
+	return nn.gelu(x, approximate=False)
+
+
+def gelu_tanh(x):
+	return nn.gelu(x, approximate=True)
+
+
+def leaky_relu(x):
+	return nn.leaky_relu(x, negative_slope=0.01)
+
+
 ACT2FN = {
-	"gelu": partial(nn.gelu, approximate=False),
+	"gelu": gelu_exact,
 	"relu": nn.relu,
 	"silu": nn.swish,
 	"swish": nn.swish,
-	"gelu_new": partial(nn.gelu, approximate=True),
-	"gelu_pytorch_tanh": partial(nn.gelu, approximate=True),
+	"gelu_new": gelu_tanh,
+	"gelu_pytorch_tanh": gelu_tanh,
 	"tanh": nn.tanh,
 	"sigmoid": nn.sigmoid,
-	"leaky_relu": partial(nn.leaky_relu, negative_slope=0.01),
+	"leaky_relu": leaky_relu,
 	"glu": nn.glu,
 	"elu": nn.elu,
 	"softmax": nn.softmax,
@@ -113,7 +126,7 @@ def canonicalize_dtype(
 	  The dtype that *args should be cast to.
 	"""
 	if dtype is None:
-		args_filtered = [jax.numpy.asarray(x) for x in args if x is not None]
+		args_filtered = [x for x in args if x is not None]
 		dtype = jax.numpy.result_type(*args_filtered)
 		if inexact and not jax.numpy.issubdtype(dtype, jax.numpy.inexact):
 			dtype = jax.numpy.promote_types(jax.numpy.float32, dtype)
@@ -122,24 +135,96 @@ def canonicalize_dtype(
 	return dtype
 
 
+_GRADIENT_CHECKPOINT_POLICIES = dict(
+	everything_saveable=jax.checkpoint_policies.everything_saveable,
+	nothing_saveable=jax.checkpoint_policies.nothing_saveable,
+	dots_saveable=jax.checkpoint_policies.dots_saveable,
+	checkpoint_dots=jax.checkpoint_policies.checkpoint_dots,
+	dots_with_no_batch_dims_saveable=jax.checkpoint_policies.dots_with_no_batch_dims_saveable,
+	checkpoint_dots_with_no_batch_dims=jax.checkpoint_policies.checkpoint_dots_with_no_batch_dims,
+	save_anything_except_these_names=jax.checkpoint_policies.save_anything_except_these_names,
+	save_any_names_but_these=jax.checkpoint_policies.save_any_names_but_these,
+	save_only_these_names=jax.checkpoint_policies.save_only_these_names,
+	save_from_both_policies=jax.checkpoint_policies.save_from_both_policies,
+)
+
+
 def get_gradient_checkpoint_policy(name):
 	"""
 	The get_gradient_checkpoint_policy function is a helper function that returns the gradient checkpoint policy
 	specified by the name parameter.
 	"""
-	gradients = dict(
-		everything_saveable=jax.checkpoint_policies.everything_saveable,
-		nothing_saveable=jax.checkpoint_policies.nothing_saveable,
-		dots_saveable=jax.checkpoint_policies.dots_saveable,
-		checkpoint_dots=jax.checkpoint_policies.checkpoint_dots,
-		dots_with_no_batch_dims_saveable=jax.checkpoint_policies.dots_with_no_batch_dims_saveable,
-		checkpoint_dots_with_no_batch_dims=jax.checkpoint_policies.checkpoint_dots_with_no_batch_dims,
-		save_anything_except_these_names=jax.checkpoint_policies.save_anything_except_these_names,
-		save_any_names_but_these=jax.checkpoint_policies.save_any_names_but_these,
-		save_only_these_names=jax.checkpoint_policies.save_only_these_names,
-		save_from_both_policies=jax.checkpoint_policies.save_from_both_policies,
+	return _GRADIENT_CHECKPOINT_POLICIES[name]
+
+
+def scan_remat(
+	body_fn: tp.Callable,
+	carry: tp.Any,
+	xs: tp.Any,
+	policy: tp.Union[str, tp.Callable] = "dots_with_no_batch_dims_saveable",
+	prevent_cse: bool = False,
+):
+	"""
+	Runs `jax.lax.scan(body_fn, carry, xs)` with `body_fn` wrapped in `jax.checkpoint`.
+
+	Meant for stacks of identical layers whose params are stacked on a leading
+	axis of `xs`: only the per-layer carry is kept as a residual, and everything
+	`policy` does not save is recomputed on the backward pass. `prevent_cse` can
+	stay off under scan, which already stops XLA from CSE-ing the recompute away.
+	"""
+	if isinstance(policy, str):
+		policy = get_gradient_checkpoint_policy(policy)
+	body_fn = jax.checkpoint(body_fn, policy=policy, prevent_cse=prevent_cse)
+	return jax.lax.scan(body_fn, carry, xs)
+
+
+def sqrt_scan_remat(
+	body_fn: tp.Callable,
+	carry: tp.Any,
+	xs: tp.Any,
+	policy: tp.Union[str, tp.Callable] = "dots_with_no_batch_dims_saveable",
+	chunk_size: tp.Optional[int] = None,
+	prevent_cse: bool = False,
+):
+	"""
+	Nested-scan version of `scan_remat` that keeps O(sqrt(L)) carries instead of O(L).
+
+	The `L` scanned steps are split into `L // chunk_size` chunks. The outer scan
+	only saves the carry at chunk boundaries; each chunk is a checkpointed
+	`scan_remat` that gets replayed on the backward pass. `chunk_size` defaults
+	to `isqrt(L)`; when it does not divide `L`, the `L % chunk_size` leftover
+	steps run as one trailing checkpointed chunk. Stacked outputs keep their
+	flat `[L, ...]` layout.
+	"""
+	length = jax.tree_util.tree_leaves(xs)[0].shape[0]
+	if chunk_size is None:
+		chunk_size = max(math.isqrt(length), 1)
+	if chunk_size < 1:
+		raise ValueError(f"`chunk_size` must be positive, got {chunk_size}.")
+	chunk_size = min(chunk_size, length)
+	num_chunks, remainder = divmod(length, chunk_size)
+	split = num_chunks * chunk_size
+
+	@functools.partial(jax.checkpoint, prevent_cse=prevent_cse)
+	def chunk_fn(chunk_carry, chunk_xs):
+		return scan_remat(body_fn, chunk_carry, chunk_xs, policy, prevent_cse)
+
+	chunked_xs = jax.tree_util.tree_map(
+		lambda x: x[:split].reshape(num_chunks, chunk_size, *x.shape[1:]), xs
 	)
-	return gradients[name]
+	carry, ys = jax.lax.scan(chunk_fn, carry, chunked_xs)
+	ys = jax.tree_util.tree_map(lambda y: y.reshape(split, *y.shape[2:]), ys)
+	if remainder:
+		carry, tail_ys = chunk_fn(
+			carry,
+			jax.tree_util.tree_map(lambda x: x[split:], xs),
+		)
+		ys = jax.tree_util.tree_map(
+			lambda y, t: jax.numpy.concatenate([y, t], axis=0),
+			ys,
+			tail_ys,
+		)
+	return carry, ys
 
 
 def add_start_docstrings(*docstr):
@@ -162,13 +247,19 @@ def add_start_docstrings(*docstr):
 	return docstring_decorator
 
 
+@lru_cache(maxsize=None)
 def get_dot_general_by_bits(
 	bits: tp.Optional[int] = None,
 	mode: tp.Literal["train", "serve", "convert"] = EasyMethod.TRAIN,
-) -> dict:
-	"""The get_general_dot function is a helper function that returns a q_flax.QDotGeneral object
-	with the specified number of bits for forward and backward passes. If no bits are specified,
-	the function returns None.
+) -> tp.Mapping[str, tp.Any]:
+	"""The get_general_dot function is a helper function that returns an AQT quantized
+	`dot_general` with the specified number of bits for forward and backward passes. If no
+	bits are specified, the function returns an empty mapping.
+
+	The returned `dot_general` is a stateless AQT `DotGeneral` that nnx layers call in place
+	of `jax.lax.dot_general`: operands are quantized on the fly in every mode (there is no
+	frozen-weight state as with linen's `AqtDotGeneral`), with deterministic rounding since
+	no per-call RNG is available. `TRAIN` also quantizes the backward pass.
 
 	Args:
 	    bits: tp.Optional[int]: Specify the number of bits for quantization
@@ -176,34 +267,34 @@ def get_dot_general_by_bits(
 	        Method for (e.q TRAIN,SERVE,...)
 
 	Returns:
-	    A dict that contain dot_general_cls
+	    A read-only mapping that contain dot_general; results are cached per
+	    (bits, mode), so every layer of a model shares the same entry.
 	"""
 	if bits is not None:
 		try:
 			from aqt.jax.v2 import config as q_config  # type: ignore
-			from aqt.jax.v2.flax import aqt_flax as q_flax  # type: ignore
 		except ModuleNotFoundError as e:
 			raise ModuleNotFoundError(
 				"No module named `aqt` has been found, please "
 				"install aqt before using bits option in EasyDeL"
 			) from e
 		if mode == EasyMethod.TRAIN:
-			rhs_quant_mode = q_flax.QuantMode.TRAIN
-		elif mode == EasyMethod.EVAL or mode == EasyMethod.SERVE:
-			rhs_quant_mode = q_flax.QuantMode.SERVE
-		elif mode == EasyMethod.CONVERT:
-			rhs_quant_mode = q_flax.QuantMode.CONVERT
+			bwd_bits = bits
+		elif mode in (EasyMethod.EVAL, EasyMethod.SERVE, EasyMethod.CONVERT):
+			bwd_bits = None
 		else:
 			raise ValueError("Unknown Quant Method for EasyMethod")
 
-			return {
-				"dot_general_cls": functools.partial(
-					q_flax.AqtDotGeneral,
-					cfg=q_config.fully_quantized(fwd_bits=bits, bwd_bits=bits),
-					rhs_quant_mode=rhs_quant_mode,
+		return types.MappingProxyType(
+			{
+				"dot_general": q_config.fully_quantized(
+					fwd_bits=bits,
+					bwd_bits=bwd_bits,
+					use_stochastic_rounding=False,
 				)
 			}
-	return {}  # empty just in case of not getting any error
+		)
+	return types.MappingProxyType({})  # empty just in case of not getting any error
 
 
 def block_wise_ffn(remat_ffn, inputs, chunk_size: int):
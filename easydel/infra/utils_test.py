@@ -0,0 +1,141 @@
+# Copyright 2023 The EASYDEL Author @erfanzar (Erfan Zare Chavoshi).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import jax
+import jax.extend
+import jax.numpy as jnp
+import numpy as np
+import pytest
+from flax import nnx as nn
+
+from .utils import get_dot_general_by_bits, scan_remat, sqrt_scan_remat
+
+hidden_size = 8
+
+
+def _body(carry, w):
+	carry = jnp.tanh(carry @ w)
+	return carry, jnp.sum(carry, axis=-1)
+
+
+def _make_inputs(length):
+	rng = np.random.RandomState(0)
+	carry = jnp.array(rng.randn(2, hidden_size), dtype=jnp.float32)
+	ws = jnp.array(
+		rng.randn(length, hidden_size, hidden_size) / np.sqrt(hidden_size),
+		dtype=jnp.float32,
+	)
+	return carry, ws
+
+
+def _loss(scan_fn):
+	def loss(carry, ws):
+		carry, ys = scan_fn(_body, carry, ws)
+		return jnp.sum(carry**2) + jnp.sum(ys)
+
+	return loss
+
+
+def _scan_lengths(jaxpr):
+	"""Lengths of every `scan` in a jaxpr, including nested ones."""
+	lengths = []
+	for eqn in jaxpr.eqns:
+		if eqn.primitive.name == "scan":
+			lengths.append(eqn.params["length"])
+		for param in eqn.params.values():
+			if isinstance(param, jax.extend.core.ClosedJaxpr):
+				lengths.extend(_scan_lengths(param.jaxpr))
+			elif isinstance(param, jax.extend.core.Jaxpr):
+				lengths.extend(_scan_lengths(param))
+	return lengths
+
+
+def test_scan_remat_matches_lax_scan():
+	"""Test that rematerialized scan gives lax.scan outputs and gradients."""
+	carry, ws = _make_inputs(6)
+	expected = jax.lax.scan(_body, carry, ws)
+	result = scan_remat(_body, carry, ws)
+	np.testing.assert_allclose(result[0], expected[0], rtol=1e-6)
+	np.testing.assert_allclose(result[1], expected[1], rtol=1e-6)
+
+	expected_grads = jax.grad(_loss(jax.lax.scan), argnums=(0, 1))(carry, ws)
+	grads = jax.grad(_loss(scan_remat), argnums=(0, 1))(carry, ws)
+	for grad, expected_grad in zip(grads, expected_grads):
+		np.testing.assert_allclose(grad, expected_grad, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize(
+	"length,chunk_size",
+	[(16, None), (7, None), (10, None), (10, 3), (5, 8)],
+)
+def test_sqrt_scan_remat_matches_lax_scan(length, chunk_size):
+	"""Test nested rematerialized scan against lax.scan, incl. non-divisible lengths."""
+
+	def sqrt_scan(body_fn, carry, xs):
+		return sqrt_scan_remat(body_fn, carry, xs, chunk_size=chunk_size)
+
+	carry, ws = _make_inputs(length)
+	expected = jax.lax.scan(_body, carry, ws)
+	result = sqrt_scan(_body, carry, ws)
+	assert result[1].shape == (length, 2)
+	np.testing.assert_allclose(result[0], expected[0], rtol=1e-6)
+	np.testing.assert_allclose(result[1], expected[1], rtol=1e-6)
+
+	expected_grads = jax.grad(_loss(jax.lax.scan), argnums=(0, 1))(carry, ws)
+	grads = jax.grad(_loss(sqrt_scan), argnums=(0, 1))(carry, ws)
+	for grad, expected_grad in zip(grads, expected_grads):
+		np.testing.assert_allclose(grad, expected_grad, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize(
+	"length,chunk_size,expected_lengths",
+	[
+		# outer scan over chunks, inner scan over one chunk
+		(16, None, [4, 4]),
+		# prime length: isqrt chunks plus one trailing chunk, not chunk_size=1
+		(7, None, [3, 2, 1]),
+		(10, 3, [3, 3, 1]),
+	],
+)
+def test_sqrt_scan_remat_chunking(length, chunk_size, expected_lengths):
+	"""Test how sqrt_scan_remat splits the scanned axis into chunks."""
+	carry, ws = _make_inputs(length)
+	jaxpr = jax.make_jaxpr(
+		lambda c, w: sqrt_scan_remat(_body, c, w, chunk_size=chunk_size)
+	)(carry, ws)
+	assert sorted(_scan_lengths(jaxpr.jaxpr), reverse=True) == expected_lengths
+
+
+def test_sqrt_scan_remat_rejects_non_positive_chunk_size():
+	"""Test that an invalid chunk size is rejected."""
+	carry, ws = _make_inputs(4)
+	with pytest.raises(ValueError):
+		sqrt_scan_remat(_body, carry, ws, chunk_size=0)
+
+
+def test_get_dot_general_by_bits():
+	"""Test that `bits` yields an AQT dot_general nnx layers can use."""
+	assert dict(get_dot_general_by_bits(None)) == {}
+	pytest.importorskip("aqt")
+
+	quantized = get_dot_general_by_bits(8)
+	assert "dot_general" in quantized
+	assert get_dot_general_by_bits(8) is quantized
+
+	inputs = jax.random.normal(jax.random.PRNGKey(0), (4, 16))
+	layer = nn.Linear(16, 8, rngs=nn.Rngs(0), **quantized)
+	reference = nn.Linear(16, 8, rngs=nn.Rngs(0))
+	outputs = layer(inputs)
+	assert not jnp.allclose(outputs, reference(inputs))
+	np.testing.assert_allclose(outputs, reference(inputs), atol=0.1)
@@ -146,10 +146,17 @@ class FlashAttention:
 		key: chex.Array, value: chex.Array, num_reps: int
 	) -> tp.Tuple[chex.Array, chex.Array]:
 		"""Repeats key and value heads to match query heads."""
-		return (
-			einops.repeat(key, "b s h d -> b s (h r) d", r=num_reps),
-			einops.repeat(value, "b s h d -> b s (h r) d", r=num_reps),
-		)
+		if num_reps == 1:
+			return key, value
+
+		def _repeat(x: chex.Array) -> chex.Array:
+			# broadcast + reshape instead of a materialized repeat, so XLA can keep
+			# the replication lazy and fuse it into the attention matmuls.
+			b, s, h, d = x.shape
+			x = jnp.broadcast_to(x[:, :, :, None, :], (b, s, h, num_reps, d))
+			return x.reshape(b, s, h * num_reps, d)
+
+		return _repeat(key), _repeat(value)
 
 	def _handle_kvhead(
 		self,
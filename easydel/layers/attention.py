@@ -167,7 +167,16 @@ class FlexibleAttentionModule(nn.Module):
 		segment_ids: tp.Optional[Array] = None,
 		causal: bool = True,
 		dropout_rng: tp.Optional[random.PRNGKey] = None,
+		sliding_window: tp.Optional[int] = None,
+		logits_soft_cap: tp.Optional[float] = None,
 	) -> AttentionOutput:
+		if logits_soft_cap is not None and not self.impl.supports_logits_soft_cap:
+			warnings.warn(
+				f"attention mechanism `{self.impl.metadata.base_config.attn_mechanism}` does not support "
+				"`logits_soft_cap`, attention logits will not be soft-capped; "
+				"use `vanilla` or `splash` attention to apply it.",
+				stacklevel=1,
+			)
 		return jtu.tree_map(
 			lambda x: x.astype(self.impl.metadata.runtime_dtype),
 			self.impl(
@@ -181,6 +190,8 @@ class FlexibleAttentionModule(nn.Module):
 				causal=causal,
 				deterministic=self.deterministic,
 				dropout_rng=dropout_rng,
+				sliding_window=sliding_window,
+				logits_soft_cap=logits_soft_cap,
 			),
 		)
 
@@ -219,10 +230,10 @@ class FlaxAttentionModule(nn.Module):
 		)
 
 		def init_attention_bias():
-			return jax.lax.select(
+			return jnp.where(
 				attention_mask > 0,
-				jnp.full(attention_mask.shape, 0.0).astype(self.dtype),
-				jnp.full(attention_mask.shape, jnp.finfo(self.dtype).min).astype(self.dtype),
+				jnp.array(0.0, dtype=self.dtype),
+				jnp.array(jnp.finfo(self.dtype).min, dtype=self.dtype),
 			)
 
 		return attention_mask, init_attention_bias
@@ -464,10 +475,10 @@ class FlaxAttentionModule(nn.Module):
 				attention_mask = attention_mask[:, :, :, -sliding_windows:]
 
 		def init_attention_bias():
-			return lax.select(
+			return jnp.where(
 				attention_mask > 0,
-				jnp.full(attention_mask.shape, 0.0).astype(self.dtype),
-				jnp.full(attention_mask.shape, jnp.finfo(self.dtype).min).astype(self.dtype),
+				jnp.array(0.0, dtype=self.dtype),
+				jnp.array(jnp.finfo(self.dtype).min, dtype=self.dtype),
 			)
 
 		return key, value, attention_mask, init_attention_bias
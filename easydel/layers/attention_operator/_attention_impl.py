@@ -195,6 +195,11 @@ class AttentionMetadata:
 
 
 class AttentionImpl(ABC):
+	# whether the implementation applies `logits_soft_cap` (tanh capping of the
+	# attention logits); `FlexibleAttentionModule` warns when it is requested from
+	# an implementation that can't apply it.
+	supports_logits_soft_cap: tp.ClassVar[bool] = False
+
 	def __init__(self, metadata: AttentionMetadata) -> None:
 		self.metadata = metadata
 
@@ -260,10 +265,17 @@ class AttentionImpl(ABC):
 		num_reps: int,
 	) -> tp.Tuple[Array, Array]:
 		"""Repeats k and v heads to match q heads."""
-		return (
-			einops.repeat(k, "b s h d -> b s (h r) d", r=num_reps),
-			einops.repeat(v, "b s h d -> b s (h r) d", r=num_reps),
-		)
+		if num_reps == 1:
+			return k, v
+
+		def _repeat(x: Array) -> Array:
+			# broadcast + reshape instead of a materialized repeat, so XLA can keep
+			# the replication lazy and fuse it into the attention matmuls.
+			b, s, h, d = x.shape
+			x = jnp.broadcast_to(x[:, :, :, None, :], (b, s, h, num_reps, d))
+			return x.reshape(b, s, h * num_reps, d)
+
+		return _repeat(k), _repeat(v)
 
 	def _handle_kvhead(
 		self,
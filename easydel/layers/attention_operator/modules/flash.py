@@ -21,7 +21,7 @@ from eformer.escale import with_sharding_constraint
 from jax import Array
 from jax import numpy as jnp
 from jax import random as jr
-from jax.experimental.pallas.ops.tpu.flash_attention import BlockSizes
+from jax.experimental.pallas.ops.tpu.flash_attention import BlockSizes, SegmentIds
 from jax.experimental.pallas.ops.tpu.flash_attention import (
 	flash_attention as pallas_flash_attention,
 )
@@ -74,6 +74,7 @@ class FlashAttn(AttentionImpl):
 		bias: tp.Optional[Array] = None,
 		init_bias: tp.Optional[tp.Callable[[], Array]] = None,
 		causal: bool = False,
+		segment_ids: tp.Optional[Array] = None,
 		**ignore,
 	) -> AttentionOutput:
 		sm_scale = self.metadata.softmax_scale
@@ -90,7 +91,10 @@ class FlashAttn(AttentionImpl):
 			attention_partition_spec,
 		) = self.metadata.get_partition_specs(runtime_type, BTHD=False)
 
-		if mask is None and bias is None and init_bias is not None:
+		if segment_ids is not None and (mask is not None or bias is not None):
+			# an explicit mask/bias takes precedence over packed segment ids.
+			segment_ids = None
+		if mask is None and bias is None and init_bias is not None and segment_ids is None:
 			bias = init_bias()
 
 		if bias is None and mask is not None:
@@ -140,16 +144,21 @@ class FlashAttn(AttentionImpl):
 				self.create_stable_sharding(key_partition_spec, pi, dep=k),
 				self.create_stable_sharding(value_partition_spec, pi, dep=v),
 				self.create_stable_sharding(bias_partition_spec, bi, dep=bias),
+				self.create_stable_sharding(
+					Ps(query_partition_spec[0], None),
+					dep=segment_ids,
+				),
 			),
 			out_specs=self.create_stable_sharding(attention_partition_spec, pi),
 			check_rep=False,
 		)
-		def _wraped_flash_attn(q, k, v, b):
+		def _wraped_flash_attn(q, k, v, b, s):
 			out = pallas_flash_attention(
 				q,
 				k,
 				v,
 				b,
+				segment_ids=SegmentIds(s, s) if s is not None else None,
 				sm_scale=sm_scale,
 				block_sizes=block_sizes,
 				causal=False if query_lenght == 1 else causal,
@@ -161,15 +170,12 @@ class FlashAttn(AttentionImpl):
 			k.transpose(0, 2, 1, 3).astype(dtype),
 			v.transpose(0, 2, 1, 3).astype(dtype),
 			bias.astype(dtype) if bias is not None else bias,
+			segment_ids.astype("i4") if segment_ids is not None else segment_ids,
 		).transpose(0, 2, 1, 3)
-
-		return AttentionOutput(
-			attention_weights=None,
-			attention_outputs=with_sharding_constraint(
-				arr=attn,
-				sharding=attention_partition_spec,
-			),
-		)
+		# `out_specs` already fixes the output sharding; `attention_partition_spec` is
+		# BHTD-ordered here, so constraining the transposed output with it only
+		# forces an extra reshard.
+		return AttentionOutput(attention_weights=None, attention_outputs=attn)
 
 	def forward_cpu(self, *args, **kwargs) -> AttentionOutput:
 		return self.forward_native(*args, **kwargs)
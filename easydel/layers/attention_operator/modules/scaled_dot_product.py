@@ -123,7 +123,11 @@ class ScaledDotProductAttn(AttentionImpl):
 	) -> AttentionOutput:
 		sm_scale = self.metadata.softmax_scale
 		sm_scale = sm_scale if sm_scale is not None else q.shape[-1] ** -0.5
-		dtype = jnp.float16
+		# cuDNN fused attention takes fp16 or bf16, keep bf16 runtimes in bf16
+		# instead of narrowing them to fp16.
+		dtype = self.metadata.runtime_dtype
+		if dtype not in (jnp.float16, jnp.bfloat16):
+			dtype = jnp.float16
 		runtime_type = self.get_runtime_type(q=q, BTHD=True)
 		func = functools.partial(
 			jax.nn.dot_product_attention,
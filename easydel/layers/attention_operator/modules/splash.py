@@ -17,12 +17,14 @@ import functools
 import typing as tp
 
 import jax
-from jax import Array
+from jax import Array, lax
 from jax import numpy as jnp
 from jax import random as jr
 from jax.experimental.pallas.ops.tpu.splash_attention import (
 	BlockSizes,
 	CausalMask,
+	FullMask,
+	LocalMask,
 	MultiHeadMask,
 	SegmentIds,
 	make_splash_mqa_single_device,
@@ -35,12 +37,27 @@ from .._attention_impl import (
 	AttentionMetadata,
 	AttentionOutput,
 	AttentionRegistry,
+	RuntimeType,
 )
 from .vanilla import VanillaAttn
 
 
 @AttentionRegistry.register
 class SplashAttn(AttentionImpl):
+	supports_logits_soft_cap = True
+
+	# preserved partition indices for (BHTD) q/k/v and for (BT) segment masks.
+	_QKV_PRESERVED = (0, 1, 3)
+	_QKV_PRESERVED_TP = (0, 3)
+	_MASK_PRESERVED = (0,)
+
+	def __init__(self, metadata: AttentionMetadata) -> None:
+		super().__init__(metadata)
+		# specs only depend on metadata, not on tensor values.
+		self._partition_specs = {
+			mode: metadata.get_partition_specs(mode, BTHD=False) for mode in RuntimeType
+		}
+
 	@classmethod
 	def get_impl_name(cls) -> tp.Union[str, tp.Tuple[str]]:
 		return "splash"
@@ -54,6 +71,157 @@ class SplashAttn(AttentionImpl):
 	def forward_gpu(self, *args, **kwargs) -> AttentionOutput:
 		raise NotImplementedError("`forward_gpu` not implemented!")
 
+	@staticmethod
+	def _fit_block(block: int, seq_len: int) -> tp.Optional[int]:
+		"""Largest multiple of 128 that is `<= block` and divides `seq_len`, if any."""
+		block = min(block, seq_len)
+		block -= block % 128
+		while block >= 128:
+			if seq_len % block == 0:
+				return block
+			block -= 128
+		return None
+
+	@staticmethod
+	@functools.lru_cache(maxsize=64)
+	def _autotune_blocks(
+		q_len: int,
+		k_len: int,
+		head_dim: int,
+	) -> tp.Tuple[tp.Optional[int], tp.Optional[int]]:
+		"""
+		Picks splash `(block_q, block_kv)` from a small table keyed by head_dim and
+		sequence lengths, shrunk to 128-aligned blocks that divide the lengths
+		(`None` where no such block exists).
+		"""
+		block_q = 512 if head_dim <= 128 else 256
+		block_kv = 1024 if k_len >= 4096 else 512
+		return SplashAttn._fit_block(block_q, q_len), SplashAttn._fit_block(block_kv, k_len)
+
+	def _select_blocks(
+		self,
+		q_len: int,
+		k_len: int,
+		head_dim: int,
+	) -> tp.Optional[tp.Tuple[int, int]]:
+		"""
+		Block sizes for the kernel. Explicit `blocksize_q`/`blocksize_k` are used as
+		given (capped at the sequence length); only unset (`None`) ones are autotuned.
+		Returns `None` when the kernel can't tile the lengths with 128-aligned blocks.
+		"""
+		auto_q, auto_kv = self._autotune_blocks(q_len, k_len, head_dim)
+		blocks = []
+		for explicit, auto, seq_len in (
+			(self.metadata.blocksize_q, auto_q, q_len),
+			(self.metadata.blocksize_k, auto_kv, k_len),
+		):
+			if explicit is None:
+				block = auto
+			else:
+				block = min(explicit, seq_len)
+				if block % 128 != 0 or seq_len % block != 0:
+					block = None
+			if block is None:
+				return None
+			blocks.append(block)
+		return tuple(blocks)
+
+	@staticmethod
+	@functools.lru_cache(maxsize=32)
+	def _build_splash_fn(
+		q_len: int,
+		k_len: int,
+		num_heads: int,
+		block_q: int,
+		block_kv: int,
+		sliding_window: tp.Optional[int] = None,
+		logits_soft_cap: tp.Optional[float] = None,
+		causal: bool = True,
+	) -> tp.Callable:
+		"""
+		Builds (and caches per shape) the batched splash kernel, so repeated
+		prefill/decode steps reuse the same mask and kernel objects.
+		"""
+		block_sizes = BlockSizes(
+			block_q=block_q,
+			block_kv_compute=block_kv,
+			block_kv=block_kv,
+			block_q_dkv=block_q,
+			block_kv_dkv=block_kv,
+			block_kv_dkv_compute=block_kv,
+			block_q_dq=block_q,
+			block_kv_dq=block_kv,
+		)
+		# masks are value-typed, every head shares one mask instance. a sliding
+		# window is a causal `LocalMask`, so skipped blocks never reach the kernel.
+		if not causal:
+			# packed non-causal inputs (e.g. vision patches), segment ids do the masking.
+			causal_mask = FullMask((q_len, k_len))
+		elif sliding_window is not None:
+			causal_mask = LocalMask(
+				(q_len, k_len),
+				window_size=(sliding_window - 1, 0),
+				offset=0,
+			)
+		else:
+			causal_mask = CausalMask((q_len, k_len))
+		return jax.vmap(
+			jax.vmap(
+				make_splash_mqa_single_device(
+					mask=MultiHeadMask([causal_mask] * num_heads),
+					block_sizes=block_sizes,
+					attn_logits_soft_cap=logits_soft_cap,
+				),
+				in_axes=(0, 0, 0, None),
+			),
+			in_axes=(0, 0, 0, 0),
+		)
+
+	@staticmethod
+	@functools.lru_cache(maxsize=64)
+	def _build_sharded_splash_fn(
+		mesh: jax.sharding.Mesh,
+		in_specs: tp.Tuple[tp.Optional[Ps], ...],
+		out_specs: Ps,
+		block_q: int,
+		block_kv: int,
+		sliding_window: tp.Optional[int] = None,
+		logits_soft_cap: tp.Optional[float] = None,
+		causal: bool = True,
+	) -> tp.Callable:
+		"""
+		Builds (and caches per mesh/specs/block sizes) the `shard_map`-wrapped splash
+		call, so forward passes don't re-decorate a fresh closure each time.
+		"""
+
+		@functools.partial(
+			shard_map,
+			mesh=mesh,
+			in_specs=in_specs,
+			out_specs=out_specs,
+			check_rep=False,
+		)
+		def _wraped_flash_attn(q, k, v, q_mask, kv_mask):
+			output_shape = q.shape[:-1] + (v.shape[-1],)
+			num_reps = q.shape[1] // k.shape[1]
+			q = q.reshape(q.shape[:-3] + (k.shape[-3], num_reps, q.shape[-2], q.shape[-1]))
+			fn = SplashAttn._build_splash_fn(
+				q_len=q.shape[-2],
+				k_len=k.shape[-2],
+				num_heads=q.shape[-3],
+				block_q=block_q,
+				block_kv=block_kv,
+				sliding_window=sliding_window,
+				logits_soft_cap=logits_soft_cap,
+				causal=causal,
+			)
+			segment_ids = None
+			if kv_mask is not None:
+				segment_ids = SegmentIds(q_mask, kv_mask)
+			return fn(q, k, v, segment_ids).reshape(output_shape)
+
+		return _wraped_flash_attn
+
 	@jax.named_scope("easydel-splashimpl-tpu")
 	def forward_tpu(
 		self,
@@ -62,23 +230,33 @@ class SplashAttn(AttentionImpl):
 		v: Array,
 		mask: tp.Optional[Array] = None,
 		causal: bool = True,
+		sliding_window: tp.Optional[int] = None,
+		logits_soft_cap: tp.Optional[float] = None,
+		segment_ids: tp.Optional[Array] = None,
 		**ignore,
 	) -> AttentionOutput:
 		query_lenght = q.shape[1]
 		value_lenght = v.shape[1]
-		if (query_lenght == 1) or not causal or ((query_lenght % 128) != 0):
+		# an explicit mask takes precedence over packed segment ids.
+		use_segments = segment_ids is not None and mask is None
+		blocks = self._select_blocks(query_lenght, value_lenght, q.shape[-1])
+		if (query_lenght == 1) or (not causal and not use_segments) or blocks is None:
+			if use_segments:
+				mask = jnp.expand_dims(
+					segment_ids[:, :, None] == segment_ids[:, None, :],
+					1,
+				)
 			return VanillaAttn(self.metadata)(
 				q=q,
 				k=k,
 				v=v,
 				mask=mask,
 				causal=causal,
+				logits_soft_cap=logits_soft_cap,
 			)
 		sm_scale = self.metadata.softmax_scale
 		sm_scale = sm_scale if sm_scale is not None else q.shape[-1] ** -0.5
 		dtype = self.metadata.runtime_dtype
-		runtime_type = self.get_runtime_type(q=q, BTHD=False)
-
 		(
 			query_partition_spec,
 			key_partition_spec,
@@ -86,39 +264,44 @@ class SplashAttn(AttentionImpl):
 			bias_partition_spec,
 			mask_partition_spec,
 			attention_partition_spec,
-		) = self.metadata.get_partition_specs(runtime_type, BTHD=False)
-		if mask is not None and mask.shape[0] != q.shape[0]:
-			num_reps_mask = q.shape[0] // mask.shape[0]
-			mask = jnp.repeat(mask, num_reps_mask, 0)
-
-		block_sizes = BlockSizes(
-			block_q=min(self.metadata.blocksize_q, query_lenght),
-			block_kv_compute=min(self.metadata.blocksize_k, value_lenght),
-			block_kv=min(self.metadata.blocksize_k, value_lenght),
-			block_q_dkv=min(self.metadata.blocksize_q, query_lenght),
-			block_kv_dkv=min(self.metadata.blocksize_k, value_lenght),
-			block_kv_dkv_compute=min(self.metadata.blocksize_k, value_lenght),
-			block_q_dq=min(self.metadata.blocksize_q, query_lenght),
-			block_kv_dq=min(self.metadata.blocksize_k, value_lenght),
-		)
-		qkv_mask_partition_spec = Ps(query_partition_spec[0], query_partition_spec[2])
+		) = self._partition_specs[self.get_runtime_type(q=q, BTHD=False)]
+		block_q, block_kv = blocks
 		q_mask, kv_mask = [None] * 2
-		if mask is not None:
+		qkv_mask_partition_spec = None
+		if use_segments:
+			# document masking: the kernel compares q/kv segment ids per block.
+			qkv_mask_partition_spec = Ps(query_partition_spec[0], query_partition_spec[2])
+			q_mask = kv_mask = jnp.broadcast_to(
+				segment_ids,
+				(q.shape[0], segment_ids.shape[-1]),
+			).astype("i4")
+		elif mask is not None:
+			# padding/packed inputs only, pure causal attention is handled lazily by
+			# `CausalMask` inside the kernel and never materializes a dense mask.
+			qkv_mask_partition_spec = Ps(query_partition_spec[0], query_partition_spec[2])
 			q_mask, kv_mask = self._split_attention_mask(mask)
+			if q_mask.shape[0] != q.shape[0]:
+				# expand the reduced (B, T) masks instead of the dense (B, 1, T, T) one.
+				if q_mask.shape[0] == 1:
+					q_mask = jnp.broadcast_to(q_mask, (q.shape[0], *q_mask.shape[1:]))
+					kv_mask = jnp.broadcast_to(kv_mask, (q.shape[0], *kv_mask.shape[1:]))
+				else:
+					num_reps_mask = q.shape[0] // q_mask.shape[0]
+					q_mask = jnp.repeat(q_mask, num_reps_mask, 0)
+					kv_mask = jnp.repeat(kv_mask, num_reps_mask, 0)
 			q_mask, kv_mask = (
 				q_mask.astype("i4"),
 				kv_mask.astype("i4"),
 			)  # pallas dont support int1 or bool in shardmap idk why
-		pi = [0, 1, 3]
-		mpi = [0]
+		pi = self._QKV_PRESERVED
+		mpi = self._MASK_PRESERVED
 		# query_partition_spec is like PB,PH,PS,PD
 		# v is like BSHD since it's not transposed yet
 		tparallel = self.metadata.mesh.shape[query_partition_spec[1]]
 		if (v.shape[2] % tparallel) == 0 and tparallel <= v.shape[2]:
-			pi = [0, 3]  # shard DP, FSDP and TP
+			pi = self._QKV_PRESERVED_TP  # shard DP, FSDP and TP
 
-		@functools.partial(
-			shard_map,
+		_wraped_flash_attn = self._build_sharded_splash_fn(
 			mesh=self.metadata.mesh,
 			in_specs=(
 				self.create_stable_sharding(query_partition_spec, pi, dep=q),
@@ -128,36 +311,23 @@ class SplashAttn(AttentionImpl):
 				self.create_stable_sharding(qkv_mask_partition_spec, mpi, dep=kv_mask),
 			),
 			out_specs=self.create_stable_sharding(attention_partition_spec, pi),
-			check_rep=False,
+			block_q=block_q,
+			block_kv=block_kv,
+			sliding_window=sliding_window,
+			logits_soft_cap=logits_soft_cap,
+			causal=causal,
 		)
-		def _wraped_flash_attn(q, k, v, q_mask, kv_mask):
-			output_shape = q.shape[:-1] + (v.shape[-1],)
-			num_reps = q.shape[1] // k.shape[1]
-			q = q.reshape(q.shape[:-3] + (k.shape[-3], num_reps, q.shape[-2], q.shape[-1]))
-			fn = jax.vmap(
-				jax.vmap(
-					make_splash_mqa_single_device(
-						mask=MultiHeadMask(
-							[CausalMask((q.shape[-2], k.shape[-2])) for _ in range(q.shape[-3])]
-						),
-						block_sizes=block_sizes,
-					),
-					in_axes=(0, 0, 0, None),
-				),
-				in_axes=(0, 0, 0, 0),
-			)
-			m = None
-			if kv_mask is not None:
-				m = SegmentIds(q_mask, kv_mask)
-			return fn(q * sm_scale, k, v, m).reshape(output_shape)
 
-		attn = _wraped_flash_attn(
-			q.transpose(0, 2, 1, 3).astype(dtype),
-			k.transpose(0, 2, 1, 3).astype(dtype),
-			v.transpose(0, 2, 1, 3).astype(dtype),
-			q_mask,
-			kv_mask,
-		).transpose(0, 2, 1, 3)
+		def _prep(x):
+			# convert first so XLA emits a single permute-with-convert copy.
+			return lax.convert_element_type(x, dtype).transpose(0, 2, 1, 3)
+
+		# splash kernel has no softmax-scale argument, fold it into q's cast so XLA
+		# fuses it with the transpose instead of a separate pass over q.
+		attn = lax.transpose(
+			_wraped_flash_attn(_prep(q * sm_scale), _prep(k), _prep(v), q_mask, kv_mask),
+			(0, 2, 1, 3),
+		)
 
 		return AttentionOutput(attention_weights=None, attention_outputs=attn)
 
@@ -177,9 +347,21 @@ class SplashAttn(AttentionImpl):
 		v: Array,
 		mask: tp.Optional[Array] = None,
 		causal: bool = True,
+		sliding_window: tp.Optional[int] = None,
+		logits_soft_cap: tp.Optional[float] = None,
+		segment_ids: tp.Optional[Array] = None,
 		**ignore,
 	) -> AttentionOutput:
-		return super().__call__(q=q, k=k, v=v, mask=mask, causal=causal)
+		return super().__call__(
+			q=q,
+			k=k,
+			v=v,
+			mask=mask,
+			causal=causal,
+			sliding_window=sliding_window,
+			logits_soft_cap=logits_soft_cap,
+			segment_ids=segment_ids,
+		)
 
 
 if __name__ == "__main__":
@@ -213,8 +395,7 @@ if __name__ == "__main__":
 		k = jr.normal(key_k, (b, ks, kh, d), dtype=jnp.float32)
 		v = jr.normal(key_v, (b, ks, kh, vd), dtype=jnp.float32)
 
-		mask = SplashAttn._create_causal_mask(max(qs, ks))[-qs:, :ks]
-		mask = jnp.broadcast_to(mask, (b, 1, qs, ks))
+		# causal-only: let the lazy `CausalMask` build predicates per block on-chip.
 		splash_out = splash_attn(q=q, k=k, v=v, mask=None).attention_outputs
 		vanilla_out = vanilla_attn(q=q, k=k, v=v, mask=None).attention_outputs
 		is_close = jnp.allclose(splash_out, vanilla_out, atol=0.125)
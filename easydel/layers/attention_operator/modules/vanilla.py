@@ -31,6 +31,8 @@ from .._attention_impl import (
 
 @AttentionRegistry.register
 class VanillaAttn(AttentionImpl):
+	supports_logits_soft_cap = True
+
 	@classmethod
 	def get_impl_name(cls) -> tp.Union[str, tp.Tuple[str]]:
 		return "vanilla"
@@ -49,6 +51,7 @@ class VanillaAttn(AttentionImpl):
 		init_bias: tp.Optional[tp.Callable[[], Array]] = None,
 		deterministic: bool = False,
 		dropout_rng: tp.Optional[jax.random.PRNGKey] = None,
+		logits_soft_cap: tp.Optional[float] = None,
 		**ignore,
 	) -> AttentionOutput:
 		sm_scale = self.metadata.softmax_scale
@@ -97,6 +100,8 @@ class VanillaAttn(AttentionImpl):
 			q, k, v = promote_dtype((q, k, v), dtype=dtype)
 
 			aw = jnp.einsum("bskhd,bmkd->bkhsm", q * sm_scale, k, optimize=True)
+			if logits_soft_cap is not None:
+				aw = logits_soft_cap * jnp.tanh(aw / logits_soft_cap)
 
 		if bias is not None:
 			if bias.shape[1] == (kh * num_reps):
@@ -160,6 +165,7 @@ class VanillaAttn(AttentionImpl):
 		init_bias: tp.Optional[tp.Callable[[], Array]] = None,
 		deterministic: bool = False,
 		dropout_rng: tp.Optional[jax.random.PRNGKey] = None,
+		logits_soft_cap: tp.Optional[float] = None,
 		**ignore,
 	) -> AttentionOutput:
 		return super().__call__(
@@ -171,6 +177,7 @@ class VanillaAttn(AttentionImpl):
 			init_bias=init_bias,
 			deterministic=deterministic,
 			dropout_rng=dropout_rng,
+			logits_soft_cap=logits_soft_cap,
 		)
 
 
@@ -55,13 +55,32 @@ class RMSNorm(nn.Module):
 	def _norm(self, x: jnp.ndarray) -> jnp.ndarray:
 		return x * lax.rsqrt(jnp.square(x).mean(-1, keepdims=True) + self.eps)
 
-	@jax.named_scope("easydel-rmsnorm")
-	def __call__(self, x: jnp.ndarray) -> jnp.ndarray:
-		org_dtype = x.dtype
+	def _compute_dtype(self) -> jnp.dtype:
 		if self.param_dtype in float8s or self.dtype in float8s:
-			x = x.astype(jnp.float32)
-		else:
-			x = x.astype(jnp.promote_types(self.dtype, jnp.float32))
+			return jnp.float32
+		return jnp.promote_types(self.dtype, jnp.float32)
+
+	def _scale(self, x: jnp.ndarray, org_dtype: jnp.dtype) -> jnp.ndarray:
 		output = self._norm(x).astype(self.dtype)
 		weight = self.kernel.astype(self.dtype)
 		return (weight * output).astype(org_dtype)
+
+	@jax.named_scope("easydel-rmsnorm")
+	def __call__(self, x: jnp.ndarray) -> jnp.ndarray:
+		return self._scale(x.astype(self._compute_dtype()), x.dtype)
+
+	@jax.named_scope("easydel-add-rmsnorm")
+	def add_and_norm(
+		self,
+		x: jnp.ndarray,
+		residual: jnp.ndarray,
+	) -> tp.Tuple[jnp.ndarray, jnp.ndarray]:
+		"""
+		Returns `(norm(x + residual), x + residual)`, normalizing the upcast sum
+		directly so XLA emits one multi-output fusion for the add and the norm.
+		"""
+		org_dtype = residual.dtype
+		hidden_states = x.astype(self._compute_dtype()) + residual.astype(
+			self._compute_dtype()
+		)
+		return self._scale(hidden_states, org_dtype), hidden_states.astype(org_dtype)
@@ -16,7 +16,6 @@ import jax
 from jax import numpy as jnp
 
 
-@jax.jit
 def quantize_row_q8_0(x: jax.Array):
 	"""
 	Quantize a row of float32 values to 8-bit integers with blockwise scaling.
@@ -34,11 +33,11 @@ def quantize_row_q8_0(x: jax.Array):
 	max_val = jnp.amax(jnp.abs(x), axis=-1, keepdims=True)
 	max_val = jnp.clip(max_val, min=eps)
 	qscale = max_val / max_int
-	qweight = jnp.clip(jnp.round(x * (1.0 / qscale)), min_int, max_int).astype(jnp.int8)
+	inv_scale = max_int / max_val
+	qweight = jnp.clip(jnp.round(x * inv_scale), min_int, max_int).astype(jnp.int8)
 	return qweight, qscale
 
 
-@jax.jit
 def dequantize_row_q8_0(quants, scales):
 	"""
 	Dequantize 8-bit integers back to float32 values using blockwise scaling.
@@ -39,19 +39,30 @@ default_kernel_init = initializers.lecun_normal()
 default_bias_init = initializers.zeros_init()
 
 
-def quantize_8bit(x):
+def quantize_8bit(
+	x,
+	axis: tp.Union[int, tp.Tuple[int, ...]] = -1,
+	dtype: Dtype = jnp.int8,
+):
 	"""
-	Quantize a row of float32 values to 8-bit integers with blockwise scaling.
+	Quantize float values to 8-bit values (int8 or fp8) with one scale per slice along `axis`.
 	"""
-	max_val = jnp.amax(jnp.abs(x.astype(jnp.float32)), axis=-1, keepdims=True)
+	# abs/amax are exact in any float dtype, so reduce natively and only upcast the
+	# (small) reduced tensor.
+	max_val = jnp.amax(jnp.abs(x), axis=axis, keepdims=True).astype(jnp.float32)
 	max_val = jnp.clip(max_val, min=1e-5)
-	qscale = max_val / 127
-	qweight = jnp.clip(
-		jnp.round(x * (1.0 / qscale)),
-		min=-128,
-		max=127,
-	).astype(jnp.int8)
-	qscale = qscale.astype(x.dtype)
+	if jnp.issubdtype(dtype, jnp.floating):
+		# fp8 storage, the convert itself rounds and values never exceed the fp8 max.
+		max_q = float(jnp.finfo(dtype).max)
+		qweight = (x * (max_q / max_val)).astype(dtype)
+		qscale = (max_val / max_q).astype(x.dtype)
+		return qweight, qscale
+	# reciprocal is taken once on the reduced tensor, the full tensor only sees a multiply.
+	# |x| <= max_val, so the rounded values are already within [-127, 127] and no
+	# clip is needed before the convert.
+	inv_scale = 127.0 / max_val
+	qweight = lax.convert_element_type(jnp.round(x * inv_scale), jnp.int8)
+	qscale = (max_val / 127).astype(x.dtype)
 	return qweight, qscale
 
 
@@ -59,85 +70,44 @@ def dequantize_8bit(quants, scales):
 	"""
 	Dequantize 8-bit integers back to values using blockwise scaling.
 	"""
-	dequantized = quants * scales
+	dequantized = quants.astype(scales.dtype) * scales
 	return dequantized
 
 
-@partial(jax.custom_vjp, nondiff_argnums=(3, 4))
-def quantized_matmul(x, qweight, qscale, transpose_weight=False, smt=True):
+def quantize_8bit_blockwise(x, block_size: int = 128, dtype: Dtype = jnp.int8):
 	"""
-	Forward pass for 8-bit quantized matrix multiplication.
+	Quantize a 2D kernel to 8-bit values with one scale per `block_size x block_size` tile.
 	"""
-	# Dequantize weights
-	dequantized = dequantize_8bit(qweight, qscale)
-
-	if transpose_weight:
-		dequantized = dequantized.T
-
-	return jnp.matmul(x, dequantized)
-
-
-def quantized_matmul_fwd(x, qweight, qscale, transpose_weight):
-	"""Forward pass that saves required values for backward pass."""
-
-	# Dequantize weights for forward computation
-	dequantized = dequantize_8bit(qweight, qscale)
-
-	if transpose_weight:
-		dequantized = dequantized.T
-
-	# Compute output
-	out = jnp.matmul(x, dequantized)
-
-	# Save values needed for backward pass
-	saved = (x, qweight, qscale, dequantized, transpose_weight)
-	return out, saved
+	rows, cols = x.shape
+	blocks = x.reshape(rows // block_size, block_size, cols // block_size, block_size)
+	qweight, qscale = quantize_8bit(blocks, axis=(1, 3), dtype=dtype)
+	return (
+		qweight.reshape(rows, cols),
+		qscale.reshape(rows // block_size, cols // block_size),
+	)
 
 
-def quantized_matmul_bwd(transpose_weight, res, grad_output):
+def dequantize_8bit_blockwise(quants, scales, block_size: int = 128):
 	"""
-	Backward pass computing gradients for quantized matrix multiplication.
-	Args:
-	    transpose_weight: Whether weight matrix was transposed
-	    res: Saved values from forward pass
-	    grad_output: Gradient of loss with respect to output
+	Dequantize a blockwise quantized 2D kernel back to values.
 	"""
-	x, qweight, qscale, dequantized, _ = res
-
-	# Gradient with respect to input x
-	if transpose_weight:
-		grad_x = jnp.matmul(grad_output, dequantized.T)
-	else:
-		grad_x = jnp.matmul(grad_output, dequantized)
-
-	# Gradient with respect to quantized weights and scales
-	if transpose_weight:
-		grad_dequant = jnp.matmul(grad_output.T, x)
-	else:
-		grad_dequant = jnp.matmul(x.T, grad_output)
-
-		# Optimize gradient calculation for scales
-	abs_qweight = jnp.abs(qweight)
-
-	# Calculate scaling factors more efficiently
-	scale_grad_factor = jnp.where(
-		abs_qweight > 0, qweight.astype(grad_dequant.dtype) / (127.0 * abs_qweight), 0.0
+	rows, cols = quants.shape
+	blocks = quants.reshape(
+		rows // block_size, block_size, cols // block_size, block_size
 	)
+	return dequantize_8bit(blocks, scales[:, None, :, None]).reshape(rows, cols)
 
-	# Compute gradients for scaling factors using einsum for better performance
-	grad_qscale = jnp.einsum("ij,ij->i", grad_dequant, scale_grad_factor)[:, jnp.newaxis]
-
-	# Compute gradients for quantized weights, avoiding clipping here
-	grad_qweight = grad_dequant * qscale
-
-	# Pack gradients for weight tuple
-	grad_weight = (grad_qweight, grad_qscale)
-
-	return grad_x, quantize_8bit(grad_weight)
 
-
-# Register the custom VJP (Vector-Jacobian Product) rules
-quantized_matmul.defvjp(quantized_matmul_fwd, quantized_matmul_bwd)
+@partial(jax.jit, static_argnames=["block_size", "dtype"])
+def _quantize_kernel_jit(kernel, block_size: tp.Optional[int], dtype: Dtype):
+	"""
+	One-shot kernel quantization compiled as a single program, quantization helpers
+	themselves stay un-jitted so they fuse into whatever traces them.
+	"""
+	if block_size is not None:
+		return quantize_8bit_blockwise(kernel, block_size, dtype)
+	# reduce over `in_features` (contraction axis), giving one scale per output channel.
+	return quantize_8bit(kernel, axis=0, dtype=dtype)
 
 
 class Linear8bit(QauntModule):
@@ -157,6 +127,9 @@ class Linear8bit(QauntModule):
 		bias_init: Initializer = default_bias_init,
 		dot_general: DotGeneralT = lax.dot_general,
 		rngs: rnglib.Rngs,
+		block_size: tp.Optional[int] = None,
+		storage_dtype: Dtype = jnp.int8,
+		blockwise: bool = False,
 	):
 		super().__init__(
 			dtype=dtype,
@@ -166,7 +139,11 @@ class Linear8bit(QauntModule):
 		if do_init:
 			kernel_key = rngs.params()
 			quant_kernel = kernel_init(kernel_key, (in_features, out_features), param_dtype)
-			quantized_kernel, quant_scales = self._quantize_kernel(quant_kernel)
+			quantized_kernel, quant_scales = self._quantize_kernel(
+				quant_kernel,
+				block_size if blockwise else None,
+				storage_dtype,
+			)
 		else:
 			quantized_kernel, quant_scales = None, None
 		# Quantize the quant_kernel
@@ -189,12 +166,18 @@ class Linear8bit(QauntModule):
 		self.kernel_init = kernel_init
 		self.bias_init = bias_init
 		self.dot_general = dot_general
+		self.block_size = block_size
+		self.storage_dtype = storage_dtype
+		self.blockwise = blockwise
 
 	@classmethod
 	def from_linear(
 		cls,
 		linear: nnx.Linear,
 		rngs: tp.Optional[rnglib.Rngs] = None,
+		block_size: tp.Optional[int] = None,
+		storage_dtype: Dtype = jnp.int8,
+		blockwise: bool = False,
 		**kwargs,
 	) -> "Linear8bit":
 		"""
@@ -203,38 +186,50 @@ class Linear8bit(QauntModule):
 		Args:
 				linear: The source Linear module
 				rngs: Random number generator state
+				block_size: Tile size for blockwise scales, only used with `blockwise=True`;
+					quantizers pass their own (NF4) block size here as well.
+				storage_dtype: `jnp.int8` (default) or an fp8 type such as `jnp.float8_e4m3fn`
+					for hardware with fp8 matmul support.
+				blockwise: Store one scale per `block_size x block_size` tile instead of one
+					per output channel. Kernels not divisible by `block_size` stay per channel.
 
 		Returns:
 				A new Linear8bit module with quantized weights
 		"""
 		if rngs is None:
 			rngs = nnx.Rngs(0)
-		# Create a new instance with minimal initialization
-		instance = nnx.eval_shape(
-			lambda: cls(
-				in_features=linear.in_features,
-				out_features=linear.out_features,
-				use_bias=linear.use_bias,
-				dtype=linear.dtype,
-				param_dtype=linear.param_dtype,
-				precision=linear.precision,
-				kernel_init=linear.kernel_init,
-				bias_init=linear.bias_init,
-				dot_general=linear.dot_general,
-				rngs=rngs,
-			)
+		# `do_init=False` only creates empty params, no need to trace it with `eval_shape`.
+		instance = cls(
+			in_features=linear.in_features,
+			out_features=linear.out_features,
+			use_bias=linear.use_bias,
+			dtype=linear.dtype,
+			param_dtype=linear.param_dtype,
+			precision=linear.precision,
+			do_init=False,
+			kernel_init=linear.kernel_init,
+			bias_init=linear.bias_init,
+			dot_general=linear.dot_general,
+			rngs=rngs,
+			block_size=block_size,
+			storage_dtype=storage_dtype,
+			blockwise=blockwise,
 		)
 
 		# Quantize the quant_kernel from the original linear layer
-		quantized_kernel, quant_scales = cls._quantize_kernel(linear.kernel.value)
+		quantized_kernel, quant_scales = cls._quantize_kernel(
+			linear.kernel.value,
+			block_size if blockwise else None,
+			storage_dtype,
+		)
 
-		# Update the parameters
-		instance.quant_kernel = nnx.Param(quantized_kernel)
-		instance.quant_scales = nnx.Param(quant_scales)
+		# Update the existing parameters in place
+		instance.quant_kernel.value = quantized_kernel
+		instance.quant_scales.value = quant_scales
 
 		# Copy the bias if it exists
 		if linear.use_bias:
-			instance.bias = nnx.Param(linear.bias.value)
+			instance.bias.value = linear.bias.value
 
 		return instance
 
@@ -266,23 +261,63 @@ class Linear8bit(QauntModule):
 			)
 		)
 
-		# Dequantize the quant_kernel and update the linear layer
-		dequantized_kernel = self._dequantize_kernel()
-		linear.quant_kernel = nnx.Param(dequantized_kernel)
+		# Dequantize the quant_kernel and update the linear layer in place
+		linear.kernel.value = self._dequantize_kernel()
 
 		# Copy the bias if it exists
 		if self.use_bias:
-			linear.bias = nnx.Param(self.bias.value)
+			linear.bias.value = self.bias.value
 
 		return linear
 
 	@staticmethod
-	def _quantize_kernel(quant_kernel):
+	def _is_blockwise(shape: tp.Tuple[int, ...], block_size: tp.Optional[int]) -> bool:
+		"""Whether a kernel of `shape` gets `block_size x block_size` tile scales."""
+		return block_size is not None and all(dim % block_size == 0 for dim in shape)
+
+	@staticmethod
+	def _scale_layout(
+		kernel_shape: tp.Tuple[int, ...],
+		scales_shape: tp.Tuple[int, ...],
+	) -> tp.Tuple[str, tp.Optional[int]]:
+		"""
+		Layout of stored `quant_scales`, read from the shapes rather than `block_size`.
+
+		Returns `("channel", None)` for `(1, out)` scales, `("row", None)` for the
+		legacy per-row `(in, 1)` scales and `("tile", B)` for `(in / B, out / B)`
+		tile scales, so kernels load correctly whatever `block_size` a loader passes.
+		"""
+		in_features, out_features = kernel_shape
+		scales_shape = tuple(scales_shape)
+		if scales_shape == (1, out_features):
+			return "channel", None
+		if scales_shape == (in_features, 1):
+			return "row", None
+		rows, cols = scales_shape
+		if (
+			in_features % rows == 0
+			and out_features % cols == 0
+			and in_features // rows == out_features // cols
+		):
+			return "tile", in_features // rows
+		raise ValueError(
+			f"quant_scales of shape {scales_shape} do not match a known layout "
+			f"for a kernel of shape {tuple(kernel_shape)}."
+		)
+
+	@classmethod
+	def _quantize_kernel(
+		cls,
+		quant_kernel,
+		block_size: tp.Optional[int] = None,
+		storage_dtype: Dtype = jnp.int8,
+	):
 		"""Quantize the quant_kernel weights."""
 		if quant_kernel is None or isinstance(quant_kernel, jax.ShapeDtypeStruct):
 			return None, None
-		quantized, quant_scales = quantize_8bit(quant_kernel)
-		return quantized, quant_scales
+		if not cls._is_blockwise(quant_kernel.shape, block_size):
+			block_size = None
+		return _quantize_kernel_jit(quant_kernel, block_size, storage_dtype)
 
 	def _dequantize_kernel(self):  # in case somebody using tie word embedding.
 		"""Dequantize the quant_kernel weights."""
@@ -290,23 +325,79 @@ class Linear8bit(QauntModule):
 			return None
 		elif self.quant_scales.value is None:
 			return self.quant_kernel
+		layout, block_size = self._scale_layout(
+			self.quant_kernel.value.shape,
+			self.quant_scales.value.shape,
+		)
+		if layout == "tile":
+			return dequantize_8bit_blockwise(
+				self.quant_kernel.value,
+				self.quant_scales.value,
+				block_size,
+			).astype(self.param_dtype)
 		return dequantize_8bit(
 			self.quant_kernel.value,
 			self.quant_scales.value,
 		).astype(self.param_dtype)
 
+	def _blockwise_matmul(
+		self,
+		inputs: Array,
+		quant_kernel: Array,
+		quant_scales: Array,
+		block_size: int,
+	):
+		"""
+		One int8 GEMM batched over the K-blocks of `block_size`; each block's fp32
+		partial product is rescaled by its tile scales and the blocks are summed.
+		"""
+		num_k_blocks = self.in_features // block_size
+		inputs = inputs.reshape(inputs.shape[:-1] + (num_k_blocks, block_size))
+		quant_kernel = quant_kernel.reshape(num_k_blocks, block_size, self.out_features)
+		quant_scales = jnp.repeat(quant_scales, block_size, axis=1).astype(jnp.float32)
+		partials = jnp.einsum(
+			"...kb,kbo->...ko",
+			inputs,
+			quant_kernel,
+			precision=self.precision,
+			preferred_element_type=jnp.float32,
+		)
+		return jnp.sum(partials * quant_scales, axis=-2)
+
 	@jax.named_scope("easydel-linear-8bit-call")
 	def __call__(self, inputs: Array) -> Array:
-		"""Forward pass using custom gradient computation."""
-		out = quantized_matmul(
-			inputs,
-			self.quant_kernel.value,
-			self.quant_scales.value,
-			transpose_weight=False,
+		"""Applies the int8 kernel directly, without materializing a dequantized copy."""
+		quant_kernel = self.quant_kernel.value
+		quant_scales = self.quant_scales.value
+
+		assert quant_kernel is not None, (
+			"loaded quant_kernel is None, which means it have been loaded from another None Kernel Linear"
 		)
+		dtype = self.dtype if self.dtype is not None else inputs.dtype
+
+		inputs = inputs.astype(dtype)
+		layout, block_size = self._scale_layout(quant_kernel.shape, quant_scales.shape)
+		if layout == "tile":
+			out = self._blockwise_matmul(inputs, quant_kernel, quant_scales, block_size)
+		else:
+			row_scaled = layout == "row"  # kernels quantized with the old per-row layout
+			if row_scaled:
+				inputs = inputs * quant_scales.reshape(-1).astype(dtype)
+			out = lax.dot_general(
+				inputs,
+				quant_kernel,
+				(((inputs.ndim - 1,), (0,)), ((), ())),
+				precision=self.precision,
+				preferred_element_type=jnp.float32,
+			)
+			if not row_scaled:
+				# scales are per output channel, so they're applied to the GEMM result.
+				out = out * quant_scales.reshape(-1)
+		# scale and bias stay in the fp32 accumulator dtype with a single cast at the end,
+		# so XLA folds them into the GEMM epilogue; a 1D bias broadcasts without reshape.
 		if self.use_bias:
 			out = out + self.bias.value
-		return out
+		return out.astype(dtype)
 
 	def get_kernel(self):
 		"""Get the dequantized quant_kernel weights."""
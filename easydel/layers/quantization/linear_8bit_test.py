@@ -0,0 +1,148 @@
+# Copyright 2023 The EASYDEL Author @erfanzar (Erfan Zare Chavoshi).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import jax
+import jax.numpy as jnp
+from flax import nnx
+
+from easydel.layers.quantization.linear_8bit import (
+	Linear8bit,
+	dequantize_8bit,
+	dequantize_8bit_blockwise,
+	quantize_8bit,
+	quantize_8bit_blockwise,
+)
+
+in_features = 256
+out_features = 384
+batch_size = 4
+
+
+def _make_linear(use_bias: bool = True):
+	return nnx.Linear(
+		in_features,
+		out_features,
+		use_bias=use_bias,
+		bias_init=jax.nn.initializers.normal(),
+		rngs=nnx.Rngs(0),
+	)
+
+
+def test_quantize_roundtrip():
+	x = jax.random.normal(jax.random.PRNGKey(0), (in_features, out_features))
+	quants, scales = quantize_8bit(x)
+	assert quants.dtype == jnp.int8
+	restored = dequantize_8bit(quants, scales)
+	assert restored.shape == x.shape
+	assert jnp.max(jnp.abs(restored - x)) <= jnp.max(scales)
+
+
+def test_linear_8bit_matches_dequantized_kernel():
+	linear = _make_linear()
+	qlinear = Linear8bit.from_linear(linear)
+	assert qlinear.quant_scales.value.shape == (1, out_features)
+	inputs = jax.random.normal(jax.random.PRNGKey(1), (batch_size, 8, in_features))
+	expected = inputs @ qlinear.get_kernel() + linear.bias.value
+	out = qlinear(inputs)
+	assert out.shape == (batch_size, 8, out_features)
+	assert jnp.allclose(out, expected, atol=1e-4)
+	assert jnp.allclose(out, linear(inputs), atol=5e-2)
+
+
+def test_linear_8bit_without_bias():
+	linear = _make_linear(use_bias=False)
+	qlinear = Linear8bit.from_linear(linear)
+	inputs = jax.random.normal(jax.random.PRNGKey(2), (batch_size, in_features))
+	assert jnp.allclose(qlinear(inputs), inputs @ qlinear.get_kernel(), atol=1e-4)
+
+
+def test_quantize_blockwise_roundtrip():
+	x = jax.random.normal(jax.random.PRNGKey(3), (in_features, out_features))
+	quants, scales = quantize_8bit_blockwise(x, 128)
+	assert quants.shape == x.shape
+	assert scales.shape == (in_features // 128, out_features // 128)
+	restored = dequantize_8bit_blockwise(quants, scales, 128)
+	assert jnp.max(jnp.abs(restored - x)) <= jnp.max(scales)
+
+
+def test_linear_8bit_blockwise():
+	linear = _make_linear()
+	qlinear = Linear8bit.from_linear(linear, block_size=128, blockwise=True)
+	assert qlinear.quant_scales.value.shape == (in_features // 128, out_features // 128)
+	inputs = jax.random.normal(jax.random.PRNGKey(4), (batch_size, 8, in_features))
+	expected = inputs @ qlinear.get_kernel() + linear.bias.value
+	assert jnp.allclose(qlinear(inputs), expected, atol=1e-4)
+
+
+def test_linear_8bit_blockwise_falls_back_to_channelwise():
+	linear = _make_linear()
+	qlinear = Linear8bit.from_linear(linear, block_size=100, blockwise=True)
+	assert qlinear.quant_scales.value.shape == (1, out_features)
+
+
+def test_linear_8bit_block_size_alone_keeps_channelwise():
+	linear = _make_linear()
+	qlinear = Linear8bit.from_linear(linear, block_size=128)
+	assert qlinear.quant_scales.value.shape == (1, out_features)
+
+
+def test_linear_8bit_single_gemm_per_path():
+	linear = _make_linear()
+	inputs = jax.random.normal(jax.random.PRNGKey(7), (batch_size, 8, in_features))
+	for blockwise in (False, True):
+		qlinear = Linear8bit.from_linear(linear, block_size=128, blockwise=blockwise)
+		jaxpr = str(jax.make_jaxpr(qlinear)(inputs))
+		assert jaxpr.count("dot_general") == 1
+		assert "scan" not in jaxpr and "while" not in jaxpr
+
+
+def test_linear_8bit_loads_legacy_row_scales_with_block_size():
+	linear = _make_linear()
+	qlinear = Linear8bit.from_linear(linear, block_size=128)
+	quants, scales = quantize_8bit(linear.kernel.value, axis=-1)
+	assert scales.shape == (in_features, 1)
+	qlinear.quant_kernel.value = quants
+	qlinear.quant_scales.value = scales
+	kernel = dequantize_8bit(quants, scales)
+	assert jnp.allclose(qlinear.get_kernel(), kernel)
+	assert jnp.allclose(qlinear.to_linear().kernel.value, kernel)
+	inputs = jax.random.normal(jax.random.PRNGKey(6), (batch_size, in_features))
+	expected = inputs @ kernel + linear.bias.value
+	assert jnp.allclose(qlinear(inputs), expected, atol=1e-4)
+
+
+def test_linear_8bit_to_linear():
+	linear = _make_linear()
+	restored = Linear8bit.from_linear(linear).to_linear()
+	assert restored.kernel.value.shape == linear.kernel.value.shape
+	assert jnp.allclose(restored.kernel.value, linear.kernel.value, atol=5e-2)
+	assert jnp.allclose(restored.bias.value, linear.bias.value)
+
+
+def test_linear_fp8_storage():
+	linear = _make_linear()
+	for block_size in (None, 128):
+		qlinear = Linear8bit.from_linear(
+			linear,
+			block_size=block_size,
+			storage_dtype=jnp.float8_e4m3fn,
+			blockwise=block_size is not None,
+		)
+		assert qlinear.quant_kernel.value.dtype == jnp.float8_e4m3fn
+		inputs = jax.random.normal(jax.random.PRNGKey(5), (batch_size, in_features))
+		expected = inputs @ qlinear.get_kernel() + linear.bias.value
+		assert jnp.allclose(qlinear(inputs), expected, atol=1e-4)
+		reference = linear(inputs)
+		rel_err = jnp.linalg.norm(qlinear(inputs) - reference) / jnp.linalg.norm(reference)
+		assert rel_err < 5e-2
@@ -308,7 +308,7 @@ class LinearNF4(QauntModule):
 
 		assert self.use_bias == (bias is not None)
 		if bias is not None:
-			y += jnp.reshape(bias, (1,) * (y.ndim - 1) + (-1,))
+			y = y + bias
 		return y
 
 	def get_kernel(self):
@@ -18,11 +18,12 @@ import math
 import typing as tp
 
 # from functools import partial
-from functools import partial
+from functools import lru_cache
 
 import chex
 import jax
 import jax.numpy as jnp
+import numpy as np
 from flax import nnx as nn
 
 
@@ -112,14 +113,17 @@ def _apply_rotary_emb(
 ) -> jnp.ndarray:
 	"""
 	Args:
-	    x: [num_tokens, num_heads, head_size]
-	    cos: [num_tokens, head_size // 2]
-	    sin: [num_tokens, head_size // 2]
+	    x: [batch, num_tokens, num_heads, head_size]
+	    cos: [batch, num_tokens, 1, head_size // 2]
+	    sin: [batch, num_tokens, 1, head_size // 2]
 	    is_neox_style: Whether to use the Neox-style or GPT-J-style rotary
 	        positional embeddings.
 	"""
-	cos = cos[:, :, None].astype(x.dtype)
-	sin = sin[:, :, None].astype(x.dtype)
+	# `apply_basic_rope` pre-casts to the query dtype; only a key of another
+	# dtype needs a cast here.
+	if cos.dtype != x.dtype:
+		cos = cos.astype(x.dtype)
+		sin = sin.astype(x.dtype)
 	assert sin.ndim == x.ndim
 	if is_neox_style:
 		x1, x2 = jnp.split(x, 2, axis=-1)
@@ -151,9 +155,16 @@ def rope_wraper(type):
 	return w
 
 
+def _compute_pos_frequencies(base: float, rotary_dim: int) -> np.ndarray:
+	"""`base ** (2i / rotary_dim)` for every rotary pair, computed on host in float32."""
+	exponents = np.arange(0, rotary_dim, 2, dtype=np.float32) / np.float32(rotary_dim)
+	return np.power(np.float32(base), exponents, dtype=np.float32)
+
+
 @jax.named_scope("easydel-rotary-compute-basic-inv-frequencies")
 def compute_basic_inv_frequencies(base: int, rotary_dim: int):
-	return 1.0 / (base ** (jnp.arange(0, rotary_dim, 2, dtype="f4") / rotary_dim))
+	# a `rotary_dim // 2` vector, cheaper on host than as its own device dispatch.
+	return jnp.asarray(np.float32(1.0) / _compute_pos_frequencies(base, rotary_dim))
 
 
 @jax.named_scope("easydel-rotary-compute-yarn-inv-frequencies")
@@ -166,7 +177,7 @@ def compute_yarn_inv_frequencies(
 	scaling_factor: float,
 	extrapolation_factor: float,
 ) -> jnp.ndarray:
-	pos_freqs = base ** (jnp.arange(0, rotary_dim, 2, dtype=jnp.float32) / rotary_dim)
+	pos_freqs = jnp.asarray(_compute_pos_frequencies(base, rotary_dim))
 	inv_freq_extrapolation = 1.0 / pos_freqs
 	inv_freq_interpolation = 1.0 / (scaling_factor * pos_freqs)
 	low, high = _yarn_find_correction_range(
@@ -342,7 +353,6 @@ def compute_phi3_frequencies(
 	position_ids_expanded = jnp.expand_dims(position_ids, 1).astype(jnp.float32)
 
 	freqs = (inv_freq_expanded @ position_ids_expanded).swapaxes(1, 2)
-	emb = jnp.concatenate((freqs, freqs), axis=-1)
 	scale = max_position_embeddings / original_max_position_embeddings
 	if scale <= 1.0:
 		scaling_factor = 1.0
@@ -351,9 +361,11 @@ def compute_phi3_frequencies(
 			1 + math.log(scale) / math.log(original_max_position_embeddings)
 		)
 
-	cos = jnp.cos(emb) * scaling_factor
-	sin = jnp.sin(emb) * scaling_factor
-	return jnp.concatenate([cos, sin], axis=-1)
+	# both halves of the neox layout share the same angles, so the transcendentals
+	# run once on `freqs` and the halves are duplicated afterwards.
+	cos = jnp.cos(freqs) * scaling_factor
+	sin = jnp.sin(freqs) * scaling_factor
+	return jnp.concatenate([cos, cos, sin, sin], axis=-1)
 
 
 @jax.named_scope("easydel-rotary-compute-llama3-frequencies")
@@ -395,7 +407,7 @@ def compute_deepseek_frequencies(
 	mscale_all_dim,
 	attn_factor,
 ) -> jnp.ndarray:
-	pos_freqs = base ** (jnp.arange(0, rotary_dim, 2, dtype=jnp.float32) / rotary_dim)
+	pos_freqs = jnp.asarray(_compute_pos_frequencies(base, rotary_dim))
 	inv_freq_extrapolation = 1.0 / pos_freqs
 	inv_freq_interpolation = 1.0 / (scaling_factor * pos_freqs)
 	low, high = _yarn_find_correction_range(
@@ -440,7 +452,10 @@ def apply_basic_rope(
 ):
 	if offsets is not None:
 		positions = positions + offsets
-	cos, sin = jnp.split(frequencies[positions], 2, -1)
+	# gather, split and cast the active rows once; query and key share them.
+	cos, sin = jnp.split(frequencies[positions][:, :, None], 2, -1)
+	cos = cos.astype(query.dtype)
+	sin = sin.astype(query.dtype)
 	if rotary_dim != query.shape[-1]:
 		query_rot = _apply_rotary_emb(query[..., :rotary_dim], cos, sin, is_neox_style)
 		query = jnp.concatenate((query_rot, query[..., rotary_dim:]), axis=-1)
@@ -466,15 +481,17 @@ def apply_phi3_rope(
 	if offsets is not None:
 		positions = positions + offsets
 	emb = frequencies[0, positions]
-	cos, sin = jnp.split(emb, 2, axis=-1)
+	# the table is `[cos, cos, sin, sin]`; one half-width copy of each is enough
+	# to rotate both halves, so no `rotate_half` negation/concat is materialized.
+	cos, _, sin, _ = jnp.split(emb, 4, axis=-1)
 	cos = jnp.expand_dims(cos, 2)
 	sin = jnp.expand_dims(sin, 2)
 
-	with jax.default_matmul_precision("float32"):
-		query_rot = query * cos + _rotate_neox(query) * sin
-		key_rot = key * cos + _rotate_neox(key) * sin
+	def _rotate(x):
+		x1, x2 = jnp.split(x, 2, axis=-1)
+		return jnp.concatenate((x1 * cos - x2 * sin, x2 * cos + x1 * sin), axis=-1)
 
-	return query_rot.astype(dtype), key_rot.astype(dtype)
+	return _rotate(query).astype(dtype), _rotate(key).astype(dtype)
 
 
 @rope_wraper("default")
@@ -507,10 +524,11 @@ class RotaryEmbedding(nn.Module):
 		"""__call__ pass for the rotary embedding."""
 		with jax.ensure_compile_time_eval():
 			if frequencies is None:
-				frequencies = compute_basic_frequencies(
-					base=self.base,
+				frequencies = get_frequencies(
+					head_size=self.head_size,
 					rotary_dim=self.rotary_dim,
-					max_position_embeddings=self.max_position_embeddings,
+					max_position=self.max_position_embeddings,
+					base=self.base,
 				)
 			if hasattr(frequencies, "value"):
 				frequencies = frequencies.value
@@ -1064,18 +1082,7 @@ def get_rope(
 	return rotary_emb
 
 
-@partial(
-	jax.jit,
-	static_argnames=[
-		"head_size",
-		"rotary_dim",
-		"max_position",
-		"base",
-		"rope_scaling",
-		"partial_rotary_factor",
-	],
-)
-def get_frequencies(
+def _compute_frequencies(
 	head_size: int,
 	rotary_dim: int,
 	max_position: int,
@@ -1201,6 +1208,78 @@ def get_frequencies(
 	return frequencies
 
 
+@lru_cache(maxsize=32)
+def _cached_frequencies(
+	head_size: int,
+	rotary_dim: int,
+	max_position: int,
+	base: int,
+	rope_scaling: tp.Optional[tp.Dict[str, tp.Any]] = None,
+	partial_rotary_factor: float = 1.0,
+	dtype: tp.Optional[jnp.dtype] = None,
+) -> np.ndarray:
+	"""
+	Host (NumPy) copy of the cos/sin table, computed once per rope setup.
+
+	Evaluation is forced to be concrete, so a first call from inside a trace
+	never caches a tracer. The builder is deliberately not jitted: every input
+	is a static Python value and each table is built once per process, so a jit
+	would only add a one-off XLA compile per rope setup. The cached array is
+	read-only; it is shared by every caller.
+	"""
+	with jax.ensure_compile_time_eval():
+		frequencies = _compute_frequencies(
+			head_size=head_size,
+			rotary_dim=rotary_dim,
+			max_position=max_position,
+			base=base,
+			rope_scaling=rope_scaling,
+			partial_rotary_factor=partial_rotary_factor,
+		)
+		if dtype is not None:
+			frequencies = frequencies.astype(dtype)
+		frequencies = np.asarray(frequencies)
+	frequencies.setflags(write=False)
+	return frequencies
+
+
+def get_frequencies(
+	head_size: int,
+	rotary_dim: int,
+	max_position: int,
+	base: int,
+	rope_scaling: tp.Optional[tp.Dict[str, tp.Any]] = None,
+	partial_rotary_factor: float = 1.0,
+	dtype: tp.Optional[jnp.dtype] = None,
+) -> jax.Array:
+	"""
+	Returns the `[max_position, rotary_dim]` cos/sin table for the given rope setup.
+
+	The table only depends on these (hashable) arguments, so it is computed once
+	and cached on host; every call uploads its own device array from that cache.
+	Handing out one shared device buffer would let a donating step (e.g. a
+	train step with `donate_argnums`) delete the table under every other model
+	built from the same setup. `rope_scaling=None` (what `RopeConfig` yields for
+	a missing/"none" rope type) selects the plain default table.
+
+	Angles and cos/sin are always computed in float32; `dtype` (e.g. bfloat16)
+	only sets the storage type of the finished table. The rope kernels cast the
+	gathered rows to the activation dtype anyway, so a table stored in that same
+	dtype gives identical outputs at half the footprint.
+	"""
+	frequencies = _cached_frequencies(
+		head_size=head_size,
+		rotary_dim=rotary_dim,
+		max_position=max_position,
+		base=base,
+		rope_scaling=rope_scaling,
+		partial_rotary_factor=partial_rotary_factor,
+		dtype=dtype,
+	)
+	with jax.ensure_compile_time_eval():
+		return jnp.array(frequencies)
+
+
 # Example usage
 if __name__ == "__main__":
 	head_size = 64
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import jax
 import jax.numpy as jnp
 
 from easydel.layers.rotary_embedding import (
@@ -22,6 +23,7 @@ from easydel.layers.rotary_embedding import (
 	Phi3LongRoPEScaledRotaryEmbedding,
 	RotaryEmbedding,
 	YaRNScalingRotaryEmbedding,
+	get_frequencies,
 	get_rope,
 )
 
@@ -234,6 +236,20 @@ def test_get_rope():
 	print(f"Pass {rotary_emb._type} (get_rope)")
 
 
+def test_get_frequencies_survives_donation():
+	kwargs = dict(head_size=64, rotary_dim=64, max_position=256, base=base)
+	frequencies = get_frequencies(**kwargs)
+	# a train step donating its inputs deletes the buffer it was handed ...
+	jax.jit(lambda x: x + 1, donate_argnums=(0,))(frequencies)
+	assert frequencies.is_deleted()
+	# ... which must not take down the table of models built afterwards.
+	rebuilt = get_frequencies(**kwargs)
+	assert not rebuilt.is_deleted()
+	assert rebuilt.shape == (256, 64)
+	assert jnp.allclose(rebuilt, get_frequencies(**kwargs))
+	print("Pass get_frequencies (donation)")
+
+
 if __name__ == "__main__":
 	test_rotary_embedding()
 	test_linear_scaling_rotary_embedding()
@@ -243,3 +259,4 @@ if __name__ == "__main__":
 	test_deepseek_yarn_scaling_rotary_embedding()
 	test_phi3_long_rope_scaled_rotary_embedding()
 	test_get_rope()
+	test_get_frequencies_survives_donation()
@@ -43,9 +43,10 @@ def repeat_kv(x: chex.Array, n_rep: int) -> chex.Array:
 	bs, s, n_kv_heads, head_dim = x.shape
 	if n_rep == 1:
 		return x
-	x = x[:, :, jnp.newaxis, :, :]
-	x = jnp.repeat(x, n_rep, axis=2)
-
+	x = jnp.broadcast_to(
+		x[:, :, jnp.newaxis, :, :],
+		(bs, s, n_rep, n_kv_heads, head_dim),
+	)
 	return x.reshape(bs, s, n_kv_heads * n_rep, head_dim)
 
 
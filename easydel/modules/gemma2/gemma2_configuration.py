@@ -22,6 +22,26 @@ from easydel.infra.etils import EasyDeLGradientCheckPointers
 from easydel.infra.factory import register_config
 
 
+_GEMMA2_PARTITION_RULES = (
+	("model/embed_tokens/embedding", PartitionSpec("tp", ("fsdp", "sp"))),
+	(
+		"self_attn/(q_proj|k_proj|v_proj)/kernel",
+		PartitionSpec(("fsdp", "sp"), "tp"),
+	),
+	("self_attn/o_proj/kernel", PartitionSpec("tp", ("fsdp", "sp"))),
+	("mlp/gate_proj/kernel", PartitionSpec(("fsdp", "sp"), "tp")),
+	("mlp/down_proj/kernel", PartitionSpec("tp", ("fsdp", "sp"))),
+	("mlp/up_proj/kernel", PartitionSpec(("fsdp", "sp"), "tp")),
+	("input_layernorm/kernel", PartitionSpec(None)),
+	("post_attention_layernorm/kernel", PartitionSpec(None)),
+	("pre_feedforward_layernorm/kernel", PartitionSpec(None)),
+	("post_feedforward_layernorm/kernel", PartitionSpec(None)),
+	("model/norm/kernel", PartitionSpec(None)),
+	("lm_head/kernel", PartitionSpec(("fsdp", "sp"), "tp")),
+	(".*", PartitionSpec(None)),
+)
+
+
 @register_config("gemma2")
 class Gemma2Config(EasyDeLBaseConfig):
 	"""
@@ -163,24 +183,7 @@ class Gemma2Config(EasyDeLBaseConfig):
 		Returns:
 		    `tp.Tuple[tp.Tuple[str, PartitionSpec]]`: The partition rules.
 		"""
-		return (
-			("model/embed_tokens/embedding", PartitionSpec("tp", ("fsdp", "sp"))),
-			(
-				"self_attn/(q_proj|k_proj|v_proj)/kernel",
-				PartitionSpec(("fsdp", "sp"), "tp"),
-			),
-			("self_attn/o_proj/kernel", PartitionSpec("tp", ("fsdp", "sp"))),
-			("mlp/gate_proj/kernel", PartitionSpec(("fsdp", "sp"), "tp")),
-			("mlp/down_proj/kernel", PartitionSpec("tp", ("fsdp", "sp"))),
-			("mlp/up_proj/kernel", PartitionSpec(("fsdp", "sp"), "tp")),
-			("input_layernorm/kernel", PartitionSpec(None)),
-			("post_attention_layernorm/kernel", PartitionSpec(None)),
-			("pre_feedforward_layernorm/kernel", PartitionSpec(None)),
-			("post_feedforward_layernorm/kernel", PartitionSpec(None)),
-			("model/norm/kernel", PartitionSpec(None)),
-			("lm_head/kernel", PartitionSpec(("fsdp", "sp"), "tp")),
-			(".*", PartitionSpec(None)),
-		)
+		return _GEMMA2_PARTITION_RULES
 
 	def attach_custom_arguments(
 		self,
@@ -202,7 +205,7 @@ class Gemma2Config(EasyDeLBaseConfig):
 
 	@staticmethod
 	def get_weight_decay_exclusions():
-		return tuple()
+		return ()
 
 	@staticmethod
 	def rng_keys():
@@ -239,6 +239,8 @@ class Gemma2Attention(FlaxAttentionModule):
 			segment_ids=segment_ids,
 			causal=True,
 			dropout_rng=self.rngs.params(),
+			sliding_window=self.sliding_window,
+			logits_soft_cap=self.config.attn_logit_softcapping,
 		)
 		attn_output = self.shard_attention_prod(
 			self._merge_heads(attentions.attention_outputs)
@@ -66,6 +66,7 @@ class PhiMLP(nn.Module):
 			param_dtype=param_dtype,
 			precision=precision,
 			rngs=rngs,
+			**get_dot_general_by_bits(config.bits, config.easy_method),
 		)
 		self.fc2 = nn.Linear(
 			config.intermediate_size,
@@ -75,6 +76,7 @@ class PhiMLP(nn.Module):
 			param_dtype=param_dtype,
 			precision=precision,
 			rngs=rngs,
+			**get_dot_general_by_bits(config.bits, config.easy_method),
 		)
 		self.act = ACT2FN[self.config.hidden_act]
 
@@ -153,7 +155,7 @@ class PhiAttention(FlaxAttentionModule):
 		self.qk_layernorm = config.qk_layernorm
 		if self.qk_layernorm:
 			self.q_layernorm = nn.LayerNorm(
-				config.hidden_size,
+				self.head_dim,
 				epsilon=config.layer_norm_eps,
 				dtype=dtype,
 				param_dtype=param_dtype,
@@ -161,7 +163,7 @@ class PhiAttention(FlaxAttentionModule):
 				use_bias=True,
 			)
 			self.k_layernorm = nn.LayerNorm(
-				config.hidden_size,
+				self.head_dim,
 				epsilon=config.layer_norm_eps,
 				dtype=dtype,
 				param_dtype=param_dtype,
@@ -222,10 +224,6 @@ class PhiAttention(FlaxAttentionModule):
 			self.v_proj(hidden_states),
 		)
 
-		if self.qk_layernorm:
-			query_states = self.q_layernorm(query_states)
-			key_states = self.k_layernorm(key_states)
-
 		query_states = query_states.reshape(
 			batch_size,
 			sequence_length,
@@ -245,6 +243,11 @@ class PhiAttention(FlaxAttentionModule):
 			self.head_dim,
 		)
 
+		if self.qk_layernorm:
+			# per-head norm over head_dim, as in the reference Phi implementation.
+			query_states = self.q_layernorm(query_states)
+			key_states = self.k_layernorm(key_states)
+
 		query_states, key_states = self.rotary(
 			query=query_states,
 			key=key_states,
@@ -340,7 +343,7 @@ class FlaxPhiDecoderLayer(nn.Module):
 			param_dtype=param_dtype,
 			rngs=rngs,
 		)
-		self.resid_dropout = nn.Dropout(self.config.resid_pdrop)
+		self.resid_dropout = nn.Dropout(self.config.resid_pdrop, rngs=rngs)
 
 	def __call__(
 		self,
@@ -510,7 +513,7 @@ class PhiModel(EasyDeLBaseModule):
 			).astype(jnp.int32)
 		if attention_mask.ndim == 2:
 			attention_mask = jnp.expand_dims(attention_mask, (1, 2))
-		hidden_states = inputs_embeds
+		hidden_states = self.embed_dropout(inputs_embeds)
 		if past_key_values is None:
 			past_key_values = TransformerCache.init_empty(len(self.layers))
 		for idx, block in enumerate(self.layers):
@@ -588,6 +591,7 @@ class PhiForCausalLM(EasyDeLBaseModule):
 			param_dtype=param_dtype,
 			precision=precision,
 			rngs=rngs,
+			**get_dot_general_by_bits(config.bits, config.easy_method),
 		)
 
 	def __call__(
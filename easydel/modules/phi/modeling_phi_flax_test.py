@@ -0,0 +1,46 @@
+# Copyright 2023 The EASYDEL Author @erfanzar (Erfan Zare Chavoshi).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import jax
+import jax.numpy as jnp
+import pytest
+from flax import nnx as nn
+
+from .modeling_phi_flax import PhiForCausalLM
+from .phi_configuration import PhiConfig
+
+
+def test_phi_bits_quantizes_mlp_and_lm_head():
+	"""Test that `bits` gives fc1, fc2 and the lm_head an AQT dot_general."""
+	pytest.importorskip("aqt")
+	config = PhiConfig(
+		vocab_size=128,
+		hidden_size=64,
+		intermediate_size=128,
+		num_hidden_layers=1,
+		num_attention_heads=4,
+		max_position_embeddings=64,
+		bits=8,
+	)
+	config.attn_mechanism = "vanilla"
+	model = PhiForCausalLM(config=config, rngs=nn.Rngs(0))
+	mlp = model.model.layers[0].mlp
+	for layer in (mlp.fc1, mlp.fc2, model.lm_head):
+		assert layer.dot_general is not jax.lax.dot_general
+		assert type(layer.dot_general).__name__ == "DotGeneral"
+
+	input_ids = jnp.arange(8)[None] % 100
+	logits = model(input_ids=input_ids).logits
+	assert logits.shape == (1, 8, 128)
+	assert jnp.all(jnp.isfinite(logits))
@@ -11,9 +11,8 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import math
 import typing as tp
-from functools import partial
+from functools import lru_cache, partial
 
 import chex
 import jax
@@ -34,7 +33,11 @@ from easydel.infra.utils import (
 	control_mlp_sharding,
 	get_dot_general_by_bits,
 )
-from easydel.layers.attention import FlaxAttentionModule, FlexibleAttentionModule
+from easydel.layers.attention import (
+	AttentionMechanisms,
+	FlaxAttentionModule,
+	FlexibleAttentionModule,
+)
 from easydel.layers.caching import TransformerCache, TransformerCacheView
 from easydel.layers.norms import RMSNorm
 from easydel.modules.qwen2_vl.qwen2_vl_configuration import (
@@ -44,29 +47,272 @@ from easydel.modules.qwen2_vl.qwen2_vl_configuration import (
 from easydel.utils import traversals as etr
 
 
-# TODO: Convert this to a jitable jax fn and use that inside model instead of precall
+def _split_grid_thw(
+	grid_thw: tp.Optional[np.ndarray],
+) -> tp.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+	"""Splits a `(n, 3)` grid into contiguous `t`, `h` and `w` arrays."""
+	if grid_thw is None:
+		return (np.zeros((0,), dtype="i4"),) * 3
+	grid_thw = np.asarray(grid_thw).reshape(-1, 3)
+	return tuple(np.ascontiguousarray(grid_thw[:, i]) for i in range(3))
+
+
+def _next_occurrence(flags: chex.Array, fallback: chex.Array) -> chex.Array:
+	"""For every index, the first index at or after it whose flag is set (else `fallback`)."""
+	index = jnp.where(flags, jnp.arange(flags.shape[0]), fallback)
+	return jax.lax.cummin(index, reverse=True)
+
+
+def _count_vision_slots(
+	input_ids: chex.Array,
+	attention_mask: chex.Array,
+	image_token_id: int,
+	video_token_id: int,
+	vision_start_token_id: int,
+) -> tp.Tuple[chex.Array, chex.Array]:
+	"""Counts the images and videos opened by a vision-start token in one sequence."""
+	valid = attention_mask == 1
+	vision_tokens = jnp.roll(input_ids, -1)
+	is_start = (
+		valid
+		& (input_ids == vision_start_token_id)
+		& (jnp.arange(input_ids.shape[0]) < input_ids.shape[0] - 1)
+	)
+	image_nums = jnp.sum(is_start & (vision_tokens == image_token_id))
+	video_nums = jnp.sum(is_start & (vision_tokens == video_token_id))
+	return image_nums, video_nums
+
+
+def _sequence_rope_index(
+	input_ids: chex.Array,
+	attention_mask: chex.Array,
+	image_nums: chex.Array,
+	video_nums: chex.Array,
+	image_index: chex.Array,
+	video_index: chex.Array,
+	image_grid_thw: chex.Array,
+	video_grid_thw: chex.Array,
+	max_vision_slots: int,
+	spatial_merge_size: int,
+	image_token_id: int,
+	video_token_id: int,
+) -> tp.Tuple[chex.Array, chex.Array]:
+	"""
+	Computes the 3D rope positions of a single sequence.
+
+	Padding is compacted away first so positions only advance over attended
+	tokens. A `lax.scan` of fixed length `max_vision_slots` then walks the vision
+	slots with a scalar carry and records each slot's start, grid and base
+	position; slots past the sequence's own vision count are masked no-ops.
+	Positions are filled in a single pass afterwards by looking every token up
+	in that slot table, so no per-slot chunk is ever allocated or concatenated.
+	"""
+	sequence_length = input_ids.shape[0]
+	valid = attention_mask == 1
+	compact_index = jnp.cumsum(valid) - 1
+	num_tokens = jnp.sum(valid)
+	compact_ids = (
+		jnp.full((sequence_length,), -1, dtype=input_ids.dtype)
+		.at[jnp.where(valid, compact_index, sequence_length)]
+		.set(input_ids, mode="drop")
+	)
+	missing = num_tokens + 1
+	# next image/video token for every start position, so each slot below does
+	# an O(1) lookup instead of searching the whole sequence.
+	next_image = _next_occurrence(compact_ids == image_token_id, missing)
+	next_video = _next_occurrence(compact_ids == video_token_id, missing)
+
+	def process_slot(carry, _):
+		st, remain_images, remain_videos, image_index, video_index, next_pos = carry
+		active = (remain_images + remain_videos) > 0
+		in_range = st < sequence_length
+		st_index = jnp.minimum(st, sequence_length - 1)
+		ed_image = jnp.where(
+			(remain_images > 0) & in_range,
+			next_image[st_index],
+			missing,
+		)
+		ed_video = jnp.where(
+			(remain_videos > 0) & in_range,
+			next_video[st_index],
+			missing,
+		)
+		use_image = ed_image < ed_video
+		t, h, w = jnp.where(
+			use_image,
+			image_grid_thw[image_index],
+			video_grid_thw[video_index],
+		)
+		h = h // spatial_merge_size
+		w = w // spatial_merge_size
+		ed = jnp.where(use_image, ed_image, ed_video)
+		text_len = ed - st
+
+		# inactive slots start past every token so the lookup never lands on them.
+		slot = (jnp.where(active, st, sequence_length + 1), ed, h, w, next_pos)
+		carry = (
+			jnp.where(active, ed + t * h * w, st),
+			remain_images - (active & use_image),
+			remain_videos - (active & ~use_image),
+			image_index + (active & use_image),
+			video_index + (active & ~use_image),
+			jnp.where(
+				active, next_pos + text_len + jnp.maximum(t, jnp.maximum(h, w)), next_pos
+			),
+		)
+		return carry, slot
+
+	init_carry = (
+		jnp.zeros((), dtype="i4"),
+		image_nums.astype("i4"),
+		video_nums.astype("i4"),
+		image_index.astype("i4"),
+		video_index.astype("i4"),
+		jnp.zeros((), dtype="i4"),
+	)
+	(st, *_, next_pos), slots = jax.lax.scan(
+		process_slot,
+		init_carry,
+		xs=None,
+		length=max_vision_slots,
+	)
+	slot_st, slot_ed, slot_h, slot_w, slot_pos = slots
+
+	index = jnp.clip(compact_index, 0)
+	slot_index = jnp.clip(jnp.searchsorted(slot_st, index, side="right") - 1, 0)
+	slot_st, slot_ed, slot_h, slot_w, slot_pos = (
+		v[slot_index] for v in (slot_st, slot_ed, slot_h, slot_w, slot_pos)
+	)
+	offset = index - slot_ed
+	slot_h = jnp.maximum(slot_h, 1)
+	slot_w = jnp.maximum(slot_w, 1)
+	vision_positions = jnp.stack(
+		[
+			offset // (slot_h * slot_w),
+			(offset // slot_w) % slot_h,
+			offset % slot_w,
+		]
+	)
+	positions = jnp.where(
+		index < slot_ed,
+		slot_pos + index - slot_st,
+		slot_pos + slot_ed - slot_st + vision_positions,
+	)
+	positions = jnp.where(index >= st, next_pos + index - st, positions)
+	positions = jnp.where(valid[None, :], positions, 1)
+	next_pos = next_pos + jnp.maximum(num_tokens - st, 0)
+	return positions, next_pos - sequence_length
+
+
+@partial(
+	jax.jit,
+	static_argnames=(
+		"max_vision_slots",
+		"spatial_merge_size",
+		"image_token_id",
+		"video_token_id",
+		"vision_start_token_id",
+	),
+)
+def _vision_rope_index(
+	input_ids: chex.Array,
+	attention_mask: chex.Array,
+	image_grid_thw: chex.Array,
+	video_grid_thw: chex.Array,
+	max_vision_slots: int,
+	spatial_merge_size: int,
+	image_token_id: int,
+	video_token_id: int,
+	vision_start_token_id: int,
+) -> tp.Tuple[chex.Array, chex.Array]:
+	"""Jitted, batched vision branch of `get_rope_index`."""
+	image_nums, video_nums = jax.vmap(
+		partial(
+			_count_vision_slots,
+			image_token_id=image_token_id,
+			video_token_id=video_token_id,
+			vision_start_token_id=vision_start_token_id,
+		)
+	)(input_ids, attention_mask)
+	# grids are laid out flat over the batch, each sequence starts where the
+	# previous one stopped consuming them.
+	image_index = jnp.cumsum(image_nums) - image_nums
+	video_index = jnp.cumsum(video_nums) - video_nums
+	position_ids, mrope_position_deltas = jax.vmap(
+		partial(
+			_sequence_rope_index,
+			image_grid_thw=image_grid_thw,
+			video_grid_thw=video_grid_thw,
+			max_vision_slots=max_vision_slots,
+			spatial_merge_size=spatial_merge_size,
+			image_token_id=image_token_id,
+			video_token_id=video_token_id,
+		)
+	)(input_ids, attention_mask, image_nums, video_nums, image_index, video_index)
+	return position_ids.transpose(1, 0, 2), mrope_position_deltas.reshape(-1, 1)
+
+
+_VISION_SLOT_BUCKETS = (1, 4, 16, 64)
+
+
+def _vision_bucket(count: int) -> int:
+	"""Rounds a vision count up to a bucket so nearby counts share one compilation."""
+	for bucket in _VISION_SLOT_BUCKETS:
+		if count <= bucket:
+			return bucket
+	return -(-count // _VISION_SLOT_BUCKETS[-1]) * _VISION_SLOT_BUCKETS[-1]
+
+
+def _as_grid(grid_thw: tp.Optional[chex.Array]) -> chex.Array:
+	"""
+	Returns `grid_thw` as an `(n, 3)` int array whose rows are zero padded up to
+	the next vision bucket; padded rows are never selected by the rope scan.
+	"""
+	if grid_thw is None:
+		grid_thw = jnp.zeros((0, 3), dtype="i4")
+	grid_thw = jnp.asarray(grid_thw, dtype="i4").reshape(-1, 3)
+	rows = grid_thw.shape[0]
+	return jnp.pad(grid_thw, ((0, _vision_bucket(rows) - rows), (0, 0)))
+
+
+@jax.jit
+def _text_rope_index(attention_mask: chex.Array) -> tp.Tuple[chex.Array, chex.Array]:
+	"""
+	Text-only branch of `get_rope_index`; a single fused kernel that decode steps
+	and vision-free calls hit without going through the vision dispatch.
+	"""
+	position_ids = jnp.cumsum(attention_mask, axis=-1) - 1
+	position_ids = jnp.where(attention_mask == 0, 1, position_ids)
+	# the three rope sections are identical for text, so broadcast instead of
+	# materializing copies.
+	position_ids = jnp.broadcast_to(position_ids[None], (3, *position_ids.shape))
+	max_position_ids = jnp.max(position_ids, axis=(0, 2), keepdims=True)
+	mrope_position_deltas = max_position_ids + 1 - attention_mask.shape[-1]
+	return position_ids, mrope_position_deltas
+
+
 def get_rope_index(
-	input_ids: np.ndarray,
-	image_grid_thw: tp.Optional[np.ndarray] = None,
-	video_grid_thw: tp.Optional[np.ndarray] = None,
-	attention_mask: tp.Optional[np.ndarray] = None,
+	input_ids: chex.Array,
+	image_grid_thw: tp.Optional[chex.Array] = None,
+	video_grid_thw: tp.Optional[chex.Array] = None,
+	attention_mask: tp.Optional[chex.Array] = None,
 	spatial_merge_size: int = 1,
 	image_token_id: int = -1,
 	video_token_id: int = -1,
 	vision_start_token_id: int = -1,
-) -> tp.Tuple[np.ndarray, np.ndarray]:
+) -> tp.Tuple[chex.Array, chex.Array]:
 	"""
 	Calculate the 3D rope index based on image and video's temporal, height, and width in LLM.
 
 	Args:
-	    input_ids (`np.ndarray` of shape `(batch_size, sequence_length)`):
+	    input_ids (`chex.Array` of shape `(batch_size, sequence_length)`):
 	        Indices of input sequence tokens in the vocabulary. Padding will be ignored by default should you provide
 	        it.
-	    image_grid_thw (`np.ndarray` of shape `(num_images, 3)`, *optional*):
+	    image_grid_thw (`chex.Array` of shape `(num_images, 3)`, *optional*):
 	        The temporal, height, and width of feature shape of each image in LLM.
-	    video_grid_thw (`np.ndarray` of shape `(num_videos, 3)`, *optional*):
+	    video_grid_thw (`chex.Array` of shape `(num_videos, 3)`, *optional*):
 	        The temporal, height, and width of feature shape of each video in LLM.
-	    attention_mask (`np.ndarray` of shape `(batch_size, sequence_length)`, *optional*):
+	    attention_mask (`chex.Array` of shape `(batch_size, sequence_length)`, *optional*):
 	        Mask to avoid performing attention on padding token indices. Mask values selected in `[0, 1]`:
 	        - 1 for tokens that are **not masked**,
 	        - 0 for tokens that are **masked**.
@@ -80,127 +326,42 @@ def get_rope_index(
 	        The token ID representing the start of a vision sequence.
 
 	Returns:
-	    position_ids (`np.ndarray` of shape `(3, batch_size, sequence_length)`)
-	    mrope_position_deltas (`np.ndarray` of shape `(batch_size)`)
+	    position_ids (`chex.Array` of shape `(3, batch_size, sequence_length)`)
+	    mrope_position_deltas (`chex.Array` of shape `(batch_size, 1)`)
 	"""
-	if input_ids.shape[-1] != 1:
+	if attention_mask is not None and input_ids.shape[-1] != 1:
 		attention_mask = attention_mask[:, : input_ids.shape[-1]]
 	if input_ids is not None and (
 		image_grid_thw is not None or video_grid_thw is not None
 	):
-		total_input_ids = input_ids
 		if attention_mask is None:
-			attention_mask = np.ones_like(total_input_ids)
-
-		position_ids = np.ones(
-			(3, input_ids.shape[0], input_ids.shape[1]), dtype=input_ids.dtype
-		)
-		image_index, video_index = 0, 0
-		mrope_position_deltas = []
-
-		for i in range(input_ids.shape[0]):
-			input_ids_masked = input_ids[i][attention_mask[i] == 1]
-			vision_start_indices = np.where(input_ids_masked == vision_start_token_id)[0]
-			vision_tokens = input_ids_masked[vision_start_indices + 1]
-			image_nums = np.sum(vision_tokens == image_token_id)
-			video_nums = np.sum(vision_tokens == video_token_id)
-			input_tokens = input_ids_masked.tolist()
-			llm_pos_ids_list = []
-			st = 0
-			remain_images, remain_videos = image_nums, video_nums
-
-			for _ in range(image_nums + video_nums):
-				if image_token_id in input_tokens and remain_images > 0:
-					ed_image = input_tokens.index(image_token_id, st)
-				else:
-					ed_image = len(input_tokens) + 1
-				if video_token_id in input_tokens and remain_videos > 0:
-					ed_video = input_tokens.index(video_token_id, st)
-				else:
-					ed_video = len(input_tokens) + 1
-				if ed_image < ed_video:
-					t, h, w = (
-						image_grid_thw[image_index][0],
-						image_grid_thw[image_index][1],
-						image_grid_thw[image_index][2],
-					)
-					image_index += 1
-					remain_images -= 1
-					ed = ed_image
-				else:
-					t, h, w = (
-						video_grid_thw[video_index][0],
-						video_grid_thw[video_index][1],
-						video_grid_thw[video_index][2],
-					)
-					video_index += 1
-					remain_videos -= 1
-					ed = ed_video
-				llm_grid_t, llm_grid_h, llm_grid_w = (
-					int(t),
-					int(h) // spatial_merge_size,
-					int(w) // spatial_merge_size,
-				)
-				text_len = ed - st
-
-				st_idx = llm_pos_ids_list[-1].max() + 1 if len(llm_pos_ids_list) > 0 else 0
-				llm_pos_ids_list.append(
-					np.arange(text_len).reshape(1, -1).repeat(3, axis=0) + st_idx
-				)
-
-				t_index = (
-					np.arange(llm_grid_t)
-					.reshape(-1, 1)
-					.repeat(llm_grid_h * llm_grid_w, axis=1)
-					.flatten()
-				)
-				h_index = (
-					np.arange(llm_grid_h)
-					.reshape(1, -1, 1)
-					.repeat(llm_grid_t, axis=0)
-					.repeat(llm_grid_w, axis=2)
-					.flatten()
-				)
-				w_index = (
-					np.arange(llm_grid_w)
-					.reshape(1, 1, -1)
-					.repeat(llm_grid_t, axis=0)
-					.repeat(llm_grid_h, axis=1)
-					.flatten()
-				)
-				llm_pos_ids_list.append(
-					np.stack([t_index, h_index, w_index]) + text_len + st_idx
-				)
-				st = ed + llm_grid_t * llm_grid_h * llm_grid_w
-
-			if st < len(input_tokens):
-				st_idx = llm_pos_ids_list[-1].max() + 1 if len(llm_pos_ids_list) > 0 else 0
-				text_len = len(input_tokens) - st
-				llm_pos_ids_list.append(
-					np.arange(text_len).reshape(1, -1).repeat(3, axis=0) + st_idx
-				)
-
-			llm_positions = np.concatenate(llm_pos_ids_list, axis=1).reshape(3, -1)
-			position_ids[:, i, attention_mask[i] == 1] = llm_positions
-			mrope_position_deltas.append(llm_positions.max() + 1 - len(total_input_ids[i]))
-
-		mrope_position_deltas = np.array(mrope_position_deltas).reshape(-1, 1)
-		return position_ids, mrope_position_deltas
+			attention_mask = jnp.ones_like(input_ids)
+		image_grid_thw = _as_grid(image_grid_thw)
+		video_grid_thw = _as_grid(video_grid_thw)
+		return _vision_rope_index(
+			input_ids=jnp.asarray(input_ids),
+			attention_mask=jnp.asarray(attention_mask),
+			image_grid_thw=image_grid_thw,
+			video_grid_thw=video_grid_thw,
+			# every sequence holds at most all of the batch's grids, bucketed so
+			# that different image/video counts reuse the same executable.
+			max_vision_slots=_vision_bucket(
+				image_grid_thw.shape[0] + video_grid_thw.shape[0]
+			),
+			spatial_merge_size=spatial_merge_size,
+			image_token_id=image_token_id,
+			video_token_id=video_token_id,
+			vision_start_token_id=vision_start_token_id,
+		)
 	else:
 		if attention_mask is not None:
-			position_ids = jnp.cumsum(attention_mask, axis=-1) - 1
-			position_ids = jnp.where(attention_mask == 0, 1, position_ids)
-			position_ids = jnp.expand_dims(position_ids, axis=0).repeat(3, axis=0)
-			max_position_ids = jnp.max(position_ids, axis=(0, 2), keepdims=True)
-			mrope_position_deltas = max_position_ids + 1 - attention_mask.shape[-1]
+			return _text_rope_index(attention_mask)
 		else:
-			position_ids = (
-				np.arange(input_ids.shape[1])
-				.reshape(1, 1, -1)
-				.repeat(3, axis=0)
-				.repeat(input_ids.shape[0], axis=1)
+			position_ids = jnp.broadcast_to(
+				jnp.arange(input_ids.shape[1]),
+				(3, *input_ids.shape),
 			)
-			mrope_position_deltas = np.zeros((input_ids.shape[0], 1), dtype=input_ids.dtype)
+			mrope_position_deltas = jnp.zeros((input_ids.shape[0], 1), dtype="i4")
 
 		return position_ids, mrope_position_deltas
 
@@ -219,9 +380,23 @@ class Qwen2VLCausalLMOutputWithPast(ModelOutput):
 	rope_deltas: tp.Optional[chex.Array] = None
 
 
+def create_segment_ids(cu_seqlens, seq_length):
+	"""
+	Maps every position to the index of the sequence it belongs to.
+
+	Args:
+	    cu_seqlens: Cumulative sequence lengths.
+	    seq_length: Total length of the packed sequences.
+
+	Returns:
+	    Segment ids of shape `(seq_length,)`.
+	"""
+	return jnp.searchsorted(cu_seqlens[1:], jnp.arange(seq_length), side="right")
+
+
 def create_attention_mask(cu_seqlens, seq_length, dtype):
 	"""
-	Creates an attention mask matrix.
+	Creates a block-diagonal attention mask matrix.
 
 	Args:
 	    cu_seqlens: Cumulative sequence lengths.
@@ -231,84 +406,103 @@ def create_attention_mask(cu_seqlens, seq_length, dtype):
 	Returns:
 	    Attention mask matrix.
 	"""
-	attention_mask = jnp.full(
-		(1, seq_length, seq_length),
+	segment_ids = create_segment_ids(cu_seqlens, seq_length)
+	return jnp.where(
+		segment_ids[None, :, None] == segment_ids[None, None, :],
+		jnp.array(0, dtype=dtype),
 		jnp.finfo(dtype).min,
-		dtype=dtype,
 	)
 
-	mask_updates = jnp.zeros((1, seq_length, seq_length), dtype=dtype)
-
-	for i in range(1, len(cu_seqlens)):
-		start_idx = cu_seqlens[i - 1]
-		end_idx = cu_seqlens[i]
-		mask_updates = mask_updates.at[
-			...,
-			start_idx:end_idx,
-			start_idx:end_idx,
-		].set(0)
 
-	attention_mask = jax.lax.dynamic_update_slice(attention_mask, mask_updates, (0, 0, 0))
-	return attention_mask
-
-
-# some of my garbage ideas but they always endup workin
-# TODO: Fix this structure somehow
 @partial(jax.jit, static_argnames=["TKN_ID"])
 def jax_scatter(sec_embeds, ids, fir_embeds, TKN_ID):
-	image_embeds = sec_embeds.astype(fir_embeds.dtype)
-
-	image_indices = (
-		jnp.where(
-			jnp.broadcast_to(
-				jnp.expand_dims(ids == TKN_ID, axis=-1), fir_embeds.shape
-			).reshape(-1),
-			size=fir_embeds.size,
-			fill_value=-1,
-		)[0]
-		+ 1
-	)
-	flatten_emb = fir_embeds.reshape(-1)
-	flatten_img_emb = image_embeds.reshape(-1)[: len(image_indices)]
-	flatten_emb = jnp.pad(flatten_emb, (1, 0))
-	flatten_img_emb = jnp.pad(
-		flatten_img_emb,
-		(0, flatten_emb.size - flatten_img_emb.size),
-		# this will default be known as 0 so it wont be used anyway
-	)
-	image_indices = jnp.pad(
-		image_indices,
-		(0, flatten_emb.size - image_indices.size),
-		# this will default be known as 0 so it wont be used anyway
+	"""
+	Writes `sec_embeds` row by row into the positions of `fir_embeds` whose id is `TKN_ID`.
+
+	The token positions are gathered once with a fixed-size `jnp.nonzero` over the
+	`(batch * sequence)` token axis, so the scatter touches only the vision rows
+	instead of masking the whole `(batch, sequence, hidden)` tensor.
+	"""
+	*lead, hidden_size = fir_embeds.shape
+	num_tokens = fir_embeds.size // hidden_size
+	sec_embeds = sec_embeds.reshape(-1, hidden_size).astype(fir_embeds.dtype)
+	(token_indices,) = jnp.nonzero(
+		ids.reshape(-1) == TKN_ID,
+		size=sec_embeds.shape[0],
+		fill_value=num_tokens,
 	)
-	scattered_embeds = flatten_emb.at[image_indices].set(flatten_img_emb)[1:]
-	fir_embeds = scattered_embeds.reshape(fir_embeds.shape)
-	return fir_embeds
+	fir_embeds = fir_embeds.reshape(num_tokens, hidden_size)
+	fir_embeds = fir_embeds.at[token_indices].set(sec_embeds, mode="drop")
+	return fir_embeds.reshape(*lead, hidden_size)
+
+
+def _grid_key(grid_thw) -> tp.Tuple[tp.Tuple[int, ...], ...]:
+	return tuple(map(tuple, np.asarray(grid_thw).reshape(-1, 3).tolist()))
 
 
+@lru_cache(maxsize=64)
+def _vision_grid_layout(
+	grid_thw: tp.Tuple[tp.Tuple[int, ...], ...],
+	spatial_merge_size: int,
+) -> tp.Tuple[np.ndarray, np.ndarray]:
+	"""
+	Host-side `(cu_seqlens, pos_ids)` of a vision grid, cached per grid shape so
+	repeated image/video shapes reuse them instead of rebuilding per call.
+	"""
+	ts, hs, ws = _split_grid_thw(grid_thw)
+	m = spatial_merge_size
+	frame_h, frame_w = np.repeat(hs, ts), np.repeat(ws, ts)
+	frame_lens = frame_h * frame_w
+	cu_seqlens = np.zeros((frame_lens.shape[0] + 1,), dtype="i4")
+	np.cumsum(frame_lens, out=cu_seqlens[1:])
+
+	frame_w = np.repeat(frame_w, frame_lens)
+	idx = np.arange(cu_seqlens[-1]) - np.repeat(cu_seqlens[:-1], frame_lens)
+	# patches are laid out merge-window major: (h/m, w/m, m, m).
+	window, inner = idx // (m * m), idx % (m * m)
+	hpos_ids = (window // (frame_w // m)) * m + inner // m
+	wpos_ids = (window % (frame_w // m)) * m + inner % m
+	pos_ids = np.stack([hpos_ids, wpos_ids], axis=-1)
+	cu_seqlens.flags.writeable = False
+	pos_ids.flags.writeable = False
+	return cu_seqlens, pos_ids
+
+
+@lru_cache(maxsize=32)
 def precompute_vl_rotary(dim, theta, max_position):
-	inv = 1.0 / (theta ** (jnp.arange(0, dim, 2, dtype="f4") / dim))
-	seq = jnp.arange(0, max_position, "f4")
-	return jnp.outer(seq, inv)
+	# host-side constant, computed once per (dim, theta, max_position).
+	inv = 1.0 / (theta ** (np.arange(0, dim, 2, dtype="f4") / dim))
+	seq = np.arange(0, max_position, dtype="f4")
+	table = np.outer(seq, inv).astype("f4")
+	table.flags.writeable = False
+	return table
 
 
-def rotate_half(x):
-	"""Rotates half the hidden dims of the input."""
-	x1 = x[..., : x.shape[-1] // 2]
-	x2 = x[..., x.shape[-1] // 2 :]
-	return jnp.concatenate([-x2, x1], axis=-1)
+def _rotate_vision(array: chex.Array, cos: chex.Array, sin: chex.Array) -> chex.Array:
+	# cos/sin are computed in f4 and narrowed once, `array` stays in its own dtype.
+	cos, sin = cos.astype(array.dtype), sin.astype(array.dtype)
+	x1, x2 = jnp.split(array, 2, axis=-1)
+	return jnp.concatenate([x1 * cos - x2 * sin, x2 * cos + x1 * sin], axis=-1)
 
 
+@jax.jit
 def apply_rotary_pos_emb_vision(array: chex.Array, freqs: chex.Array) -> chex.Array:
-	orig_dtype = array.dtype
-	array = array.astype("f4")
-	cos = jnp.cos(freqs)
-	sin = jnp.sin(freqs)
-	cos = jnp.expand_dims(jnp.repeat(jnp.expand_dims(cos, 1), 2, -1), 0).astype("f4")
-	sin = jnp.expand_dims(jnp.repeat(jnp.expand_dims(sin, 1), 2, -1), 0).astype("f4")
-	output = (array * cos) + (rotate_half(array) * sin)
-	output = output.astype(orig_dtype)
-	return output.squeeze(0)
+	# half-split rotation on `(seq, heads, head_dim)` with `freqs` of shape
+	# `(seq, head_dim // 2)`, cos/sin broadcast over heads instead of tiled.
+	freqs = jnp.expand_dims(freqs, 1).astype("f4")
+	return _rotate_vision(array, jnp.cos(freqs), jnp.sin(freqs))
+
+
+@jax.jit
+def apply_rotary_pos_emb_vision_qk(
+	q: chex.Array,
+	k: chex.Array,
+	freqs: chex.Array,
+) -> tp.Tuple[chex.Array, chex.Array]:
+	"""Rotates `q` and `k` in one fused call, sharing the cos/sin of `freqs`."""
+	freqs = jnp.expand_dims(freqs, 1).astype("f4")
+	cos, sin = jnp.cos(freqs), jnp.sin(freqs)
+	return _rotate_vision(q, cos, sin), _rotate_vision(k, cos, sin)
 
 
 class PatchEmbed(nn.Module):
@@ -319,8 +513,8 @@ class PatchEmbed(nn.Module):
 		in_channels: int = 3,
 		embed_dim: int = 1152,
 		precision: jax.lax.PrecisionLike = None,
-		dtype: jnp.dtype = jnp.float32,
-		param_dtype: jnp.dtype = jnp.float32,
+		dtype: jnp.dtype = jnp.bfloat16,
+		param_dtype: jnp.dtype = jnp.bfloat16,
 		*,
 		rngs: nn.Rngs,
 	) -> None:
@@ -344,19 +538,12 @@ class PatchEmbed(nn.Module):
 		)
 
 	def __call__(self, hidden_states: chex.Array) -> chex.Array:
-		hidden_states = jnp.transpose(
-			hidden_states.reshape(
-				-1,
-				self.in_channels,
-				self.temporal_patch_size,
-				self.patch_size,
-				self.patch_size,
-			),
-			(0, 2, 3, 4, 1),
-		)
-		hidden_states = self.proj(hidden_states.astype(self.dtype))
-		hidden_states = hidden_states.reshape(-1, self.embed_dim)
-		return hidden_states
+		# strides == kernel_size, so the conv is one GEMM over flattened (C, T, P, P)
+		# patches; the small kernel is reordered to match instead of the input.
+		kernel = jnp.transpose(self.proj.kernel.value, (3, 0, 1, 2, 4))
+		kernel = kernel.reshape(-1, self.embed_dim).astype(self.dtype)
+		hidden_states = hidden_states.reshape(-1, kernel.shape[0]).astype(self.dtype)
+		return jnp.dot(hidden_states, kernel, precision=self.proj.precision)
 
 
 class PatchMerger(nn.Module):
@@ -366,8 +553,8 @@ class PatchMerger(nn.Module):
 		context_dim: int,
 		spatial_merge_size: int = 2,
 		precision: jax.lax.PrecisionLike = None,
-		dtype: jnp.dtype = jnp.float32,
-		param_dtype: jnp.dtype = jnp.float32,
+		dtype: jnp.dtype = jnp.bfloat16,
+		param_dtype: jnp.dtype = jnp.bfloat16,
 		*,
 		rngs: nn.Rngs,
 	) -> None:
@@ -415,8 +602,8 @@ class VisionMlp(nn.Module):
 		hidden_dim: int,
 		hidden_act: str,
 		precision: jax.lax.PrecisionLike = None,
-		dtype: jnp.dtype = jnp.float32,
-		param_dtype: jnp.dtype = jnp.float32,
+		dtype: jnp.dtype = jnp.bfloat16,
+		param_dtype: jnp.dtype = jnp.bfloat16,
 		*,
 		rngs: nn.Rngs,
 	) -> None:
@@ -450,8 +637,8 @@ class VisionAttention(FlaxAttentionModule):
 		dim: int,
 		num_heads: int = 16,
 		precision: jax.lax.PrecisionLike = None,
-		dtype: jnp.dtype = jnp.float32,
-		param_dtype: jnp.dtype = jnp.float32,
+		dtype: jnp.dtype = jnp.bfloat16,
+		param_dtype: jnp.dtype = jnp.bfloat16,
 		*,
 		rngs: nn.Rngs,
 	):
@@ -481,6 +668,12 @@ class VisionAttention(FlaxAttentionModule):
 			softmax_scale=self.head_dim**-0.5,
 			dropout_prob=0.0,
 		)
+		# the TPU flash/splash kernels mask packed images natively from segment ids,
+		# other backends get the block-diagonal mask.
+		self._use_segment_ids = jax.default_backend() == "tpu" and (
+			self.attention_performer.impl.get_impl_name()
+			in (AttentionMechanisms.FLASH_ATTN2, AttentionMechanisms.SPLASH)
+		)
 
 	def __call__(
 		self,
@@ -489,55 +682,27 @@ class VisionAttention(FlaxAttentionModule):
 		rotary_pos_emb: chex.Array = None,
 	) -> chex.Array:
 		seq_length = hidden_states.shape[0]
-		q, k, v = map(
-			lambda x: x.squeeze(0),
-			jnp.split(
-				self.qkv(hidden_states)
-				.reshape(seq_length, 3, self.num_heads, -1)
-				.transpose(1, 0, 2, 3),  # seq spl nhd fea -> spl seq nhd fea
-				3,
-				0,
-			),
-		)
-		q = apply_rotary_pos_emb_vision(q, rotary_pos_emb)
-		k = apply_rotary_pos_emb_vision(k, rotary_pos_emb)
-
-		# q = jnp.expand_dims(q, 0)
-		# k = jnp.expand_dims(k, 0)
-		# v = jnp.expand_dims(v, 0)
-		# attention_mask = jnp.full(
-		# 	(1, seq_length, seq_length),
-		# 	jnp.finfo(q.dtype).min,
-		# 	dtype=q.dtype,
-		# )
-		# for i in range(1, len(cu_seqlens)):
-		# 	mask = attention_mask.at[
-		# 		...,
-		# 		cu_seqlens[i - 1] : cu_seqlens[i],
-		# 		cu_seqlens[i - 1] : cu_seqlens[i],
-		# 	].set(0)
-		# 	attention_mask = mask
-		row_ids = jnp.arange(seq_length)[None, None, :]
-		col_ids = jnp.arange(seq_length)[None, :, None]
-		starts = cu_seqlens[:-1][:, None, None]
-		ends = cu_seqlens[1:][:, None, None]
-		is_valid = (
-			(row_ids >= starts) & (row_ids < ends) & (col_ids >= starts) & (col_ids < ends)
-		)
-		combined_mask = jnp.any(is_valid, axis=0)
-		attention_mask = jnp.where(combined_mask, 0.0, jnp.finfo(q.dtype).min)
-
-		q = q.swapaxes(0, 1)
-		k = k.swapaxes(0, 1)
-		v = v.swapaxes(0, 1)
-		attn_weights = jnp.matmul(q, k.swapaxes(1, 2)) / math.sqrt(self.head_dim)
-		attn_weights = attn_weights + attention_mask
-		attn_weights = jax.nn.softmax(
-			attn_weights.astype(jnp.float32),
-			axis=-1,
-		).astype(q.dtype)
-		attn_output = jnp.matmul(attn_weights, v)
-		attn_output = attn_output.swapaxes(0, 1)
+		# index the split axis directly so XLA folds the slices into consumers.
+		qkv = self.qkv(hidden_states).reshape(seq_length, 3, self.num_heads, -1)
+		q, k, v = qkv[:, 0], qkv[:, 1], qkv[:, 2]
+		q, k = apply_rotary_pos_emb_vision_qk(q, k, rotary_pos_emb)
+
+		segment_ids = jnp.expand_dims(create_segment_ids(cu_seqlens, seq_length), 0)
+		attention_mask = None
+		if not self._use_segment_ids:
+			attention_mask = jnp.expand_dims(
+				segment_ids[:, :, None] == segment_ids[:, None, :],
+				1,
+			)
+			segment_ids = None
+		attn_output = self.attention_performer.forward(
+			query_states=jnp.expand_dims(q, 0),
+			key_states=jnp.expand_dims(k, 0),
+			value_states=jnp.expand_dims(v, 0),
+			attention_mask=attention_mask,
+			segment_ids=segment_ids,
+			causal=False,
+		).attention_outputs
 		attn_output = attn_output.reshape(seq_length, -1)
 		attn_output = self.proj(attn_output)
 		return attn_output
@@ -548,8 +713,8 @@ class Qwen2VLVisionBlock(nn.Module):
 		self,
 		config: Qwen2VLVisionConfig,
 		precision: jax.lax.PrecisionLike = None,
-		dtype: jnp.dtype = jnp.float32,
-		param_dtype: jnp.dtype = jnp.float32,
+		dtype: jnp.dtype = jnp.bfloat16,
+		param_dtype: jnp.dtype = jnp.bfloat16,
 		*,
 		rngs: nn.Rngs,
 	) -> None:
@@ -602,8 +767,8 @@ class Qwen2VLMLP(nn.Module):
 	def __init__(
 		self,
 		config: Qwen2VLConfig,
-		dtype: jnp.dtype = jnp.float32,
-		param_dtype: jnp.dtype = jnp.float32,
+		dtype: jnp.dtype = jnp.bfloat16,
+		param_dtype: jnp.dtype = jnp.bfloat16,
 		precision: jax.lax.PrecisionLike = None,
 		*,
 		rngs: nn.Rngs,
@@ -641,19 +806,19 @@ class Qwen2VLMLP(nn.Module):
 
 	def __call__(self, hidden_states: jnp.ndarray) -> jnp.ndarray:
 		hidden_states = control_mlp_sharding(hidden_states, self.config.partition_axis)
-		hidden_states = self.down_proj(
-			self.act_fn(self.gate_proj(hidden_states)) * self.up_proj(hidden_states)
-		)
-
-		return hidden_states
+		# gate/up stay separate params (HF layout, `tp` shards each on its output
+		# axis); XLA merges the two dots sharing `hidden_states` and fuses
+		# `act(gate) * up` into one elementwise pass under jit.
+		gate, up = self.gate_proj(hidden_states), self.up_proj(hidden_states)
+		return self.down_proj(self.act_fn(gate) * up)
 
 
 class Qwen2VLAttention(FlaxAttentionModule):
 	def __init__(
 		self,
 		config: Qwen2VLConfig,
-		dtype: jnp.dtype = jnp.float32,
-		param_dtype: jnp.dtype = jnp.float32,
+		dtype: jnp.dtype = jnp.bfloat16,
+		param_dtype: jnp.dtype = jnp.bfloat16,
 		precision: jax.lax.PrecisionLike = None,
 		*,
 		rngs: nn.Rngs,
@@ -807,8 +972,8 @@ class Qwen2VLDecoderLayer(nn.Module):
 	def __init__(
 		self,
 		config: Qwen2VLConfig,
-		dtype: jnp.dtype = jnp.float32,
-		param_dtype: jnp.dtype = jnp.float32,
+		dtype: jnp.dtype = jnp.bfloat16,
+		param_dtype: jnp.dtype = jnp.bfloat16,
 		precision: jax.lax.PrecisionLike = None,
 		*,
 		rngs: nn.Rngs,
@@ -878,10 +1043,10 @@ class Qwen2VLDecoderLayer(nn.Module):
 			fcm_mask,
 			frequencies,
 		)
-		attn_output = attn_outputs[0]
-		hidden_states = hidden_states + attn_output
-
-		feed_forward_input = self.post_attention_layernorm(hidden_states)
+		feed_forward_input, hidden_states = self.post_attention_layernorm.add_and_norm(
+			attn_outputs[0],
+			hidden_states,
+		)
 
 		if self.config.use_scan_mlp:
 			feed_forward_hidden_states = block_wise_ffn(
@@ -908,8 +1073,8 @@ class Qwen2VisionTransformerPretrainedModel(EasyDeLBaseModule):
 	def __init__(
 		self,
 		config: Qwen2VLConfig,
-		dtype: jnp.dtype = jnp.float32,
-		param_dtype: jnp.dtype = jnp.float32,
+		dtype: jnp.dtype = jnp.bfloat16,
+		param_dtype: jnp.dtype = jnp.bfloat16,
 		precision: jax.lax.PrecisionLike = None,
 		*,
 		rngs: nn.Rngs,
@@ -937,16 +1102,33 @@ class Qwen2VisionTransformerPretrainedModel(EasyDeLBaseModule):
 		head_dim = config.embed_dim // config.num_heads
 		self._head_dim_ro = head_dim // 2
 
-		self.blocks = [
-			Qwen2VLVisionBlock(
-				config=config,
-				dtype=dtype,
-				param_dtype=param_dtype,
-				precision=precision,
-				rngs=rngs,
-			)
-			for _ in range(config.depth)
-		]
+		self.scan_layers = bool(getattr(config, "scan_layers", False))
+		if self.scan_layers:
+			# one block module whose parameters carry a leading `depth` axis, so the
+			# forward scans over the stored state directly.
+			@nn.split_rngs(splits=config.depth)
+			@nn.vmap(in_axes=0, out_axes=0)
+			def _stacked_blocks(rngs: nn.Rngs):
+				return Qwen2VLVisionBlock(
+					config=config,
+					dtype=dtype,
+					param_dtype=param_dtype,
+					precision=precision,
+					rngs=rngs,
+				)
+
+			self.blocks = _stacked_blocks(rngs)
+		else:
+			self.blocks = [
+				Qwen2VLVisionBlock(
+					config=config,
+					dtype=dtype,
+					param_dtype=param_dtype,
+					precision=precision,
+					rngs=rngs,
+				)
+				for _ in range(config.depth)
+			]
 
 		self.merger = PatchMerger(
 			dim=config.hidden_size,
@@ -959,60 +1141,31 @@ class Qwen2VisionTransformerPretrainedModel(EasyDeLBaseModule):
 		)
 
 	def get_dtype(self) -> jnp.dtype:
-		return self.blocks[0].mlp.fc2.kernel.value.dtype
+		block = self.blocks if self.scan_layers else self.blocks[0]
+		return block.mlp.fc2.kernel.value.dtype
+
+	def _scan_blocks(self, hidden_states, cu_seqlens, rotary_pos_emb) -> chex.Array:
+		# the stacked block is traced once under `lax.scan`, each step slicing one
+		# layer out of the stored `depth`-major params. Non-param state (the rngs
+		# kept by `split_rngs`, which are not stacked) is broadcast to every step.
+		graphdef, params, others = nn.split(self.blocks, nn.Param, ...)
+
+		def _step(carry, layer_params):
+			block = nn.merge(graphdef, layer_params, others)
+			return block(carry, cu_seqlens=cu_seqlens, rotary_pos_emb=rotary_pos_emb), None
+
+		hidden_states, _ = jax.lax.scan(_step, hidden_states, params)
+		return hidden_states
 
 	def rot_pos_emb(self, grid_thw, max_grid_size):
-		pos_ids = []
-
-		for t, h, w in grid_thw:
-			# Create height position ids
-			hpos_ids = jnp.arange(h)
-			hpos_ids = jnp.expand_dims(hpos_ids, 1)
-			hpos_ids = jnp.broadcast_to(hpos_ids, (h, w))
-
-			# Reshape and permute height positions
-			hpos_ids = hpos_ids.reshape(
-				h // self.spatial_merge_size,
-				self.spatial_merge_size,
-				w // self.spatial_merge_size,
-				self.spatial_merge_size,
-			)
-			hpos_ids = jnp.transpose(hpos_ids, (0, 2, 1, 3))
-			hpos_ids = hpos_ids.flatten()
-
-			# Create width position ids
-			wpos_ids = jnp.arange(w)
-			wpos_ids = jnp.expand_dims(wpos_ids, 0)
-			wpos_ids = jnp.broadcast_to(wpos_ids, (h, w))
-
-			# Reshape and permute width positions
-			wpos_ids = wpos_ids.reshape(
-				h // self.spatial_merge_size,
-				self.spatial_merge_size,
-				w // self.spatial_merge_size,
-				self.spatial_merge_size,
-			)
-			wpos_ids = jnp.transpose(wpos_ids, (0, 2, 1, 3))
-			wpos_ids = wpos_ids.flatten()
-
-			# Stack and repeat
-			stacked = jnp.stack([hpos_ids, wpos_ids], axis=-1)
-			repeated = jnp.repeat(stacked, t, axis=1)
-			pos_ids.append(repeated)
-
-		pos_ids = jnp.concatenate(pos_ids, axis=0)
-		rotary_pos_emb_full = jnp.outer(
-			jnp.arange(0, max_grid_size, dtype="f4"),
-			1.0
-			/ (
-				10000 ** (jnp.arange(0, self._head_dim_ro, 2, dtype="f4") / self._head_dim_ro)
-			),
+		_, pos_ids = _vision_grid_layout(_grid_key(grid_thw), self.spatial_merge_size)
+		rotary_pos_emb_full = precompute_vl_rotary(
+			self._head_dim_ro,
+			10000.0,
+			int(max_grid_size),
 		)
-		# Index into embeddings and flatten
-		rotary_pos_emb = jnp.take(rotary_pos_emb_full, pos_ids, axis=0)
-		rotary_pos_emb = rotary_pos_emb.reshape(pos_ids.shape[0], -1)
-
-		return rotary_pos_emb
+		# Index into embeddings and flatten, both inputs are host constants.
+		return jnp.asarray(rotary_pos_emb_full[pos_ids].reshape(pos_ids.shape[0], -1))
 
 	def __call__(
 		self,
@@ -1022,20 +1175,37 @@ class Qwen2VisionTransformerPretrainedModel(EasyDeLBaseModule):
 	) -> chex.Array:
 		hidden_states = self.patch_embed(hidden_states)
 		rotary_pos_emb = self.rot_pos_emb(grid_thw, max_grid_size)
-
-		grid_lens = grid_thw[:, 1] * grid_thw[:, 2]
-		repeated = jnp.repeat(grid_lens, grid_thw[:, 0])
-		cu_seqlens = jnp.cumsum(repeated, dtype="i4")
-		cu_seqlens = jnp.pad(cu_seqlens, (1, 0), constant_values=0)
-		for block in self.blocks:
-			hidden_states = block(
-				hidden_states,
-				cu_seqlens=cu_seqlens,
-				rotary_pos_emb=rotary_pos_emb,
-			)
+		cu_seqlens, _ = _vision_grid_layout(_grid_key(grid_thw), self.spatial_merge_size)
+		cu_seqlens = jax.device_put(cu_seqlens)
+		if self.scan_layers:
+			hidden_states = self._scan_blocks(hidden_states, cu_seqlens, rotary_pos_emb)
+		else:
+			for block in self.blocks:
+				hidden_states = block(
+					hidden_states,
+					cu_seqlens=cu_seqlens,
+					rotary_pos_emb=rotary_pos_emb,
+				)
 
 		return self.merger(hidden_states)
 
+	def jitted_call(
+		self,
+		hidden_states: chex.Array,
+		grid_thw: chex.Array,
+		max_grid_size,
+	) -> chex.Array:
+		"""
+		Compiled `__call__`, specialized on the host-side `grid_thw` and
+		`max_grid_size`; repeated image/video shapes reuse one executable.
+		"""
+		return _jitted_vision_call(
+			self,
+			hidden_states,
+			grid_thw=_grid_key(grid_thw),
+			max_grid_size=int(max_grid_size),
+		)
+
 
 @register_module(
 	TaskType.BASE_MODULE,
@@ -1046,8 +1216,8 @@ class Qwen2VLModel(EasyDeLBaseModule):
 	def __init__(
 		self,
 		config: Qwen2VLConfig,
-		dtype: jnp.dtype = jnp.float32,
-		param_dtype: jnp.dtype = jnp.float32,
+		dtype: jnp.dtype = jnp.bfloat16,
+		param_dtype: jnp.dtype = jnp.bfloat16,
 		precision: jax.lax.PrecisionLike = None,
 		*,
 		rngs: nn.Rngs,
@@ -1113,10 +1283,15 @@ class Qwen2VLModel(EasyDeLBaseModule):
 			f"Maximum Position Embedding Reached ! (Excepted <= {self.config.max_position_embeddings} got {sequence_length})"
 		)
 		if attention_mask is None:
+			if position_ids is None:
+				# no padding, positions are contiguous and need no cumsum.
+				position_ids = jnp.broadcast_to(
+					jnp.arange(sequence_length, dtype=jnp.int32),
+					(batch_size, sequence_length),
+				)
 			attention_mask = jnp.ones((batch_size, sequence_length), "b1")
-		else:
-			if attention_mask.dtype != jnp.bool:
-				attention_mask = jnp.astype(attention_mask == 1, "b1")
+		elif attention_mask.dtype != jnp.bool:
+			attention_mask = jnp.astype(attention_mask == 1, "b1")
 		if position_ids is None:
 			position_ids = jnp.broadcast_to(
 				jnp.clip(jnp.cumsum(attention_mask, axis=-1) - 1, a_min=0),
@@ -1124,8 +1299,12 @@ class Qwen2VLModel(EasyDeLBaseModule):
 			).astype(jnp.int32)
 
 		hidden_states = inputs_embeds
+		causal_mask = self.causal_mask
 		if past_key_values is None:
 			past_key_values = TransformerCache.init_empty(len(self.layers))
+			# without a cache every layer only needs the `(seq, seq)` corner, slice it
+			# once here rather than carrying the `(max_pos, max_pos)` mask per layer.
+			causal_mask = causal_mask[:, :, :sequence_length, :sequence_length]
 		for idx, block in enumerate(self.layers):
 			if output_hidden_states:
 				all_hidden_states += (hidden_states,)
@@ -1135,7 +1314,7 @@ class Qwen2VLModel(EasyDeLBaseModule):
 				attention_mask=attention_mask,
 				position_ids=position_ids,
 				cache_view=past_key_values.views[idx],
-				causal_mask=self.causal_mask,
+				causal_mask=causal_mask,
 				output_attentions=output_attentions,
 				segment_ids=segment_ids,
 				frequencies=self.frequencies,
@@ -1163,6 +1342,45 @@ class Qwen2VLModel(EasyDeLBaseModule):
 			past_key_values=past_key_values,
 		)
 
+	def jitted_call(
+		self,
+		input_ids: tp.Optional[chex.Array] = None,
+		inputs_embeds: tp.Optional[chex.Array] = None,
+		attention_mask: tp.Optional[chex.Array] = None,
+		position_ids: tp.Optional[chex.Array] = None,
+		segment_ids: tp.Optional[chex.Array] = None,
+		past_key_values: tp.Optional[TransformerCache] = None,
+		output_attentions: tp.Optional[bool] = None,
+		output_hidden_states: tp.Optional[bool] = None,
+		return_dict: bool = True,
+	) -> tp.Union[FlaxBaseModelOutput, tp.Tuple]:
+		"""Compiled `__call__`, with the output flags treated as static."""
+		return _jitted_model_call(
+			self,
+			input_ids=input_ids,
+			inputs_embeds=inputs_embeds,
+			attention_mask=attention_mask,
+			position_ids=position_ids,
+			segment_ids=segment_ids,
+			past_key_values=past_key_values,
+			output_attentions=output_attentions,
+			output_hidden_states=output_hidden_states,
+			return_dict=return_dict,
+		)
+
+
+@partial(nn.jit, static_argnames=("grid_thw", "max_grid_size"))
+def _jitted_vision_call(module, hidden_states, grid_thw, max_grid_size):
+	return module(hidden_states, np.asarray(grid_thw), max_grid_size)
+
+
+@partial(
+	nn.jit,
+	static_argnames=("output_attentions", "output_hidden_states", "return_dict"),
+)
+def _jitted_model_call(module, **kwargs):
+	return module(**kwargs)
+
 
 @register_module(
 	TaskType.IMAGE_TEXT_TO_TEXT,
@@ -1175,8 +1393,8 @@ class Qwen2VLForConditionalGeneration(EasyDeLBaseModule):
 	def __init__(
 		self,
 		config: Qwen2VLConfig,
-		dtype: jnp.dtype = jnp.float32,
-		param_dtype: jnp.dtype = jnp.float32,
+		dtype: jnp.dtype = jnp.bfloat16,
+		param_dtype: jnp.dtype = jnp.bfloat16,
 		precision: jax.lax.PrecisionLike = None,
 		*,
 		rngs: nn.Rngs,
@@ -1212,6 +1430,7 @@ class Qwen2VLForConditionalGeneration(EasyDeLBaseModule):
 			param_dtype=param_dtype,
 			precision=precision,
 			rngs=rngs,
+			**get_dot_general_by_bits(config.bits, config.easy_method),
 		)
 
 	def get_input_embeddings(self):
@@ -1255,35 +1474,58 @@ class Qwen2VLForConditionalGeneration(EasyDeLBaseModule):
 			return_dict if return_dict is not None else self.config.use_return_dict
 		)
 
+		# looked up once per call, these are read by both vision branches, the
+		# embedding merge and the rope index.
+		image_token_id = self.config.image_token_id
+		video_token_id = self.config.video_token_id
 		if inputs_embeds is None:
+			vision_dtype = self.visual.get_dtype()
 			inputs_embeds = self.model.embed_tokens(input_ids)
-			if pixel_values is not None:
-				pixel_values = pixel_values.astype(self.visual.get_dtype())
-				image_embeds = self.visual(
-					pixel_values,
-					grid_thw=np.array(image_grid_thw),
-					max_grid_size=image_max_grid_size,
+			if pixel_values is not None and pixel_values_videos is not None:
+				# both modalities go through the vision tower in a single pass, the
+				# packed sequences are already separated by `cu_seqlens`.
+				image_grid_thw = np.array(image_grid_thw).reshape(-1, 3)
+				video_grid_thw = np.array(video_grid_thw).reshape(-1, 3)
+				vision_embeds = self.visual(
+					jnp.concatenate([pixel_values, pixel_values_videos], axis=0).astype(
+						vision_dtype
+					),
+					grid_thw=np.concatenate([image_grid_thw, video_grid_thw], axis=0),
+					max_grid_size=max(int(image_max_grid_size), int(video_max_grid_size)),
 				)
+				num_image_tokens = int(np.prod(image_grid_thw, axis=-1).sum()) // (
+					self.visual.spatial_merge_size**2
+				)
+				image_embeds = vision_embeds[:num_image_tokens]
+				video_embeds = vision_embeds[num_image_tokens:]
+			else:
+				image_embeds = video_embeds = None
+				if pixel_values is not None:
+					image_embeds = self.visual(
+						pixel_values.astype(vision_dtype),
+						grid_thw=np.array(image_grid_thw),
+						max_grid_size=image_max_grid_size,
+					)
+				if pixel_values_videos is not None:
+					video_embeds = self.visual(
+						pixel_values_videos.astype(vision_dtype),
+						grid_thw=np.array(video_grid_thw),
+						max_grid_size=video_max_grid_size,
+					)
+
+			if image_embeds is not None:
 				inputs_embeds = jax_scatter(
 					image_embeds,
 					input_ids,
 					inputs_embeds,
-					self.config.image_token_id,
-				)
-
-			if pixel_values_videos is not None:
-				pixel_values_videos = pixel_values_videos.astype(self.visual.get_dtype())
-				video_embeds = self.visual(
-					pixel_values_videos,
-					grid_thw=np.array(video_grid_thw),
-					max_grid_size=video_max_grid_size,
+					image_token_id,
 				)
-
+			if video_embeds is not None:
 				inputs_embeds = jax_scatter(
 					video_embeds,
 					input_ids,
 					inputs_embeds,
-					self.config.video_token_id,
+					video_token_id,
 				)
 
 		if (
@@ -1291,21 +1533,33 @@ class Qwen2VLForConditionalGeneration(EasyDeLBaseModule):
 			and input_ids is not None
 			and (attention_mask is None or attention_mask.ndim == 2)
 		):
-			if past_key_values is not None or rope_deltas is None:
+			if (
+				image_grid_thw is None
+				and video_grid_thw is None
+				and attention_mask is not None
+				and (past_key_values is not None or rope_deltas is None)
+			):
+				rope_mask = attention_mask
+				if input_ids.shape[-1] != 1:
+					rope_mask = rope_mask[:, : input_ids.shape[-1]]
+				position_ids, rope_deltas = _text_rope_index(rope_mask)
+			elif past_key_values is not None or rope_deltas is None:
 				position_ids, rope_deltas = get_rope_index(
 					input_ids=input_ids,
 					image_grid_thw=image_grid_thw,
 					video_grid_thw=video_grid_thw,
 					attention_mask=attention_mask,
 					spatial_merge_size=self.visual.spatial_merge_size,
-					image_token_id=self.config.image_token_id,
-					video_token_id=self.config.video_token_id,
+					image_token_id=image_token_id,
+					video_token_id=video_token_id,
 					vision_start_token_id=self.config.vision_start_token_id,
 				)
 			else:
 				batch_size, sequence_length = inputs_embeds.shape[:2]
-				position_ids = jnp.arange(sequence_length).reshape(1, -1).repeat(batch_size, 0)
-				position_ids = jnp.expand_dims(position_ids, 0).repeat(3, 0)
+				position_ids = jnp.broadcast_to(
+					jnp.arange(sequence_length),
+					(3, batch_size, sequence_length),
+				)
 		outputs = self.model(
 			input_ids=None,
 			position_ids=position_ids,
@@ -1332,6 +1586,52 @@ class Qwen2VLForConditionalGeneration(EasyDeLBaseModule):
 			rope_deltas=rope_deltas,
 		)
 
+	def jitted_call(
+		self,
+		input_ids: chex.Array = None,
+		attention_mask: tp.Optional[chex.Array] = None,
+		position_ids: tp.Optional[chex.Array] = None,
+		past_key_values: tp.Optional[TransformerCache] = None,
+		inputs_embeds: tp.Optional[chex.Array] = None,
+		output_attentions: tp.Optional[bool] = None,
+		output_hidden_states: tp.Optional[bool] = None,
+		return_dict: tp.Optional[bool] = None,
+		pixel_values: tp.Optional[chex.Array] = None,
+		pixel_values_videos: tp.Optional[chex.Array] = None,
+		image_grid_thw: tp.Optional[tuple] = None,
+		video_grid_thw: tp.Optional[tuple] = None,
+		rope_deltas: tp.Optional[chex.Array] = None,
+		image_max_grid_size: int = None,
+		video_max_grid_size: int = None,
+	) -> tp.Union[tp.Tuple, Qwen2VLCausalLMOutputWithPast]:
+		"""
+		Compiled `__call__`; the vision encoders, the embedding merge, the rope
+		index and the language model run as one graph specialized on the
+		host-side grids and output flags.
+		"""
+		return _jitted_causal_lm_call(
+			self,
+			input_ids=input_ids,
+			attention_mask=attention_mask,
+			position_ids=position_ids,
+			past_key_values=past_key_values,
+			inputs_embeds=inputs_embeds,
+			output_attentions=output_attentions,
+			output_hidden_states=output_hidden_states,
+			return_dict=return_dict,
+			pixel_values=pixel_values,
+			pixel_values_videos=pixel_values_videos,
+			image_grid_thw=None if image_grid_thw is None else _grid_key(image_grid_thw),
+			video_grid_thw=None if video_grid_thw is None else _grid_key(video_grid_thw),
+			rope_deltas=rope_deltas,
+			image_max_grid_size=(
+				None if image_max_grid_size is None else int(image_max_grid_size)
+			),
+			video_max_grid_size=(
+				None if video_max_grid_size is None else int(video_max_grid_size)
+			),
+		)
+
 	def prepare_inputs_for_generation(
 		self,
 		input_ids,
@@ -1416,8 +1716,10 @@ class Qwen2VLForConditionalGeneration(EasyDeLBaseModule):
 				)
 			else:
 				batch_size, sequence_length = others.get("input_ids").shape
-				position_ids = jnp.arange(sequence_length).reshape(1, -1).repeat(batch_size, 0)
-				position_ids = jnp.expand_dims(position_ids, 0).repeat(3, 0)
+				position_ids = jnp.broadcast_to(
+					jnp.arange(sequence_length),
+					(3, batch_size, sequence_length),
+				)
 		if drop_ids:
 			others.pop("input_ids", None)
 		others.update(
@@ -1500,5 +1802,22 @@ class Qwen2VLForConditionalGeneration(EasyDeLBaseModule):
 		model_kwargs["past_key_values"] = model_outputs.past_key_values
 		model_kwargs["position_ids"] = model_kwargs["position_ids"][:, :, -1:] + 1
 		model_kwargs.pop("pixel_values", None)  # only effect first iter
+		model_kwargs.pop("pixel_values_videos", None)  # only effect first iter
 		model_kwargs.pop("token_type_ids", None)  # only effect first iter
 		return model_kwargs
+
+
+@partial(
+	nn.jit,
+	static_argnames=(
+		"output_attentions",
+		"output_hidden_states",
+		"return_dict",
+		"image_grid_thw",
+		"video_grid_thw",
+		"image_max_grid_size",
+		"video_max_grid_size",
+	),
+)
+def _jitted_causal_lm_call(module, **kwargs):
+	return module(**kwargs)
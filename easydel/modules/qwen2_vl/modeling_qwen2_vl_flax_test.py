@@ -0,0 +1,235 @@
+# Copyright 2023 The EASYDEL Author @erfanzar (Erfan Zare Chavoshi).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+import pytest
+from flax import nnx as nn
+
+from .modeling_qwen2_vl_flax import (
+	Qwen2VisionTransformerPretrainedModel,
+	Qwen2VLForConditionalGeneration,
+	get_rope_index,
+)
+from .qwen2_vl_configuration import Qwen2VLConfig, Qwen2VLVisionConfig
+
+vision_kwargs = dict(
+	depth=3,
+	embed_dim=64,
+	hidden_size=32,
+	num_heads=16,
+	patch_size=2,
+	temporal_patch_size=2,
+	spatial_merge_size=2,
+)
+
+# token ids used by the rope index cases below
+vision_start_id, image_id, video_id = 5, 6, 7
+
+# `get_rope_index` cases: (input_ids, attention_mask, image_grid_thw,
+# video_grid_thw, expected position_ids, expected mrope deltas). Expected values
+# of the first three were produced by the original per-token Python loop.
+rope_index_cases = {
+	# image and video in both rows, left padding
+	"mixed_left_padding": (
+		[
+			[1, 1, 5, 6, 6, 6, 6, 1, 5, 7, 7, 7, 7, 1, 1],
+			[0, 0, 0, 1, 5, 7, 7, 7, 7, 5, 6, 6, 6, 6, 1],
+		],
+		[
+			[1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+			[0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+		],
+		[[1, 4, 4], [1, 4, 4]],
+		[[2, 4, 2], [2, 4, 2]],
+		[
+			[
+				[0, 1, 2, 3, 3, 3, 3, 5, 6, 7, 7, 8, 8, 9, 10],
+				[1, 1, 1, 0, 1, 2, 2, 3, 3, 4, 5, 5, 5, 5, 7],
+			],
+			[
+				[0, 1, 2, 3, 3, 4, 4, 5, 6, 7, 8, 7, 8, 9, 10],
+				[1, 1, 1, 0, 1, 2, 3, 2, 3, 4, 5, 5, 6, 6, 7],
+			],
+			[
+				[0, 1, 2, 3, 4, 3, 4, 5, 6, 7, 7, 7, 7, 9, 10],
+				[1, 1, 1, 0, 1, 2, 2, 2, 2, 4, 5, 6, 5, 6, 7],
+			],
+		],
+		[[-4], [-7]],
+	),
+	# grids consumed across rows in order, right (bucket) padding
+	"mixed_right_padding": (
+		[
+			[1, 5, 6, 6, 6, 6, 1, 1, 1, 0, 0, 0, 0, 0],
+			[1, 1, 5, 7, 7, 7, 7, 1, 5, 6, 6, 6, 6, 1],
+		],
+		[
+			[1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0],
+			[1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+		],
+		[[1, 4, 4], [1, 4, 4]],
+		[[2, 4, 2]],
+		[
+			[
+				[0, 1, 2, 2, 2, 2, 4, 5, 6, 1, 1, 1, 1, 1],
+				[0, 1, 2, 3, 3, 4, 4, 5, 6, 7, 7, 7, 7, 9],
+			],
+			[
+				[0, 1, 2, 2, 3, 3, 4, 5, 6, 1, 1, 1, 1, 1],
+				[0, 1, 2, 3, 4, 3, 4, 5, 6, 7, 7, 8, 8, 9],
+			],
+			[
+				[0, 1, 2, 3, 2, 3, 4, 5, 6, 1, 1, 1, 1, 1],
+				[0, 1, 2, 3, 3, 3, 3, 5, 6, 7, 8, 7, 8, 9],
+			],
+		],
+		[[-7], [-4]],
+	),
+	# second row has no vision tokens
+	"text_only_row": (
+		[[1, 5, 6, 6, 6, 6, 1, 1], [0, 0, 0, 1, 1, 1, 1, 1]],
+		[[1, 1, 1, 1, 1, 1, 1, 1], [0, 0, 0, 1, 1, 1, 1, 1]],
+		[[1, 4, 4]],
+		None,
+		[
+			[[0, 1, 2, 2, 2, 2, 4, 5], [1, 1, 1, 0, 1, 2, 3, 4]],
+			[[0, 1, 2, 2, 3, 3, 4, 5], [1, 1, 1, 0, 1, 2, 3, 4]],
+			[[0, 1, 2, 3, 2, 3, 4, 5], [1, 1, 1, 0, 1, 2, 3, 4]],
+		],
+		[[-2], [-3]],
+	),
+	# second row is all padding (no vision and no attended tokens), which the
+	# original loop could not handle; it keeps the padding position 1.
+	"empty_row": (
+		[[1, 5, 6, 6, 6, 6, 1, 1], [0, 0, 0, 0, 0, 0, 0, 0]],
+		[[1, 1, 1, 1, 1, 1, 1, 1], [0, 0, 0, 0, 0, 0, 0, 0]],
+		[[1, 4, 4]],
+		None,
+		[
+			[[0, 1, 2, 2, 2, 2, 4, 5], [1, 1, 1, 1, 1, 1, 1, 1]],
+			[[0, 1, 2, 2, 3, 3, 4, 5], [1, 1, 1, 1, 1, 1, 1, 1]],
+			[[0, 1, 2, 3, 2, 3, 4, 5], [1, 1, 1, 1, 1, 1, 1, 1]],
+		],
+		[[-2], [-8]],
+	),
+}
+
+
+def _vision_tower(scan_layers):
+	config = Qwen2VLVisionConfig(scan_layers=scan_layers, **vision_kwargs)
+	config.attn_mechanism = "vanilla"
+	return Qwen2VisionTransformerPretrainedModel(
+		config,
+		dtype=jnp.float32,
+		param_dtype=jnp.float32,
+		rngs=nn.Rngs(0),
+	)
+
+
+def _stack_block_params(blocks):
+	return jax.tree_util.tree_map(
+		lambda *xs: jnp.stack(xs),
+		*[nn.state(block, nn.Param) for block in blocks],
+	)
+
+
+def test_vision_scan_layers_matches_unrolled():
+	"""Test the scanned vision tower against the per-block loop with the same weights."""
+	unrolled = _vision_tower(scan_layers=False)
+	scanned = _vision_tower(scan_layers=True)
+	assert scanned.blocks.attn.qkv.kernel.value.shape == (3, 64, 192)
+
+	nn.update(scanned.blocks, _stack_block_params(unrolled.blocks))
+	nn.update(scanned.patch_embed, nn.state(unrolled.patch_embed, nn.Param))
+	nn.update(scanned.merger, nn.state(unrolled.merger, nn.Param))
+
+	grid_thw = np.array([[1, 4, 4], [2, 2, 4]])
+	num_patches = int(np.prod(grid_thw, -1).sum())
+	hidden_states = jax.random.normal(jax.random.PRNGKey(0), (num_patches, 3 * 2 * 2 * 2))
+
+	expected = unrolled(hidden_states, grid_thw, 4)
+	result = scanned(hidden_states, grid_thw, 4)
+	np.testing.assert_allclose(result, expected, rtol=1e-5, atol=1e-5)
+
+	def loss(model):
+		return jnp.sum(model(hidden_states, grid_thw, 4) ** 2)
+
+	unrolled_grads = nn.grad(loss)(unrolled)
+	scanned_grads = nn.grad(loss)(scanned)
+	np.testing.assert_allclose(
+		scanned_grads["blocks"]["attn"]["qkv"]["kernel"].value,
+		jnp.stack(
+			[unrolled_grads["blocks"][i]["attn"]["qkv"]["kernel"].value for i in range(3)]
+		),
+		rtol=1e-4,
+		atol=1e-5,
+	)
+	np.testing.assert_allclose(
+		scanned_grads["patch_embed"]["proj"]["kernel"].value,
+		unrolled_grads["patch_embed"]["proj"]["kernel"].value,
+		rtol=1e-4,
+		atol=1e-5,
+	)
+
+
+def test_bits_quantizes_lm_head():
+	"""Test that `bits` gives the vocab projection an AQT dot_general."""
+	pytest.importorskip("aqt")
+	config = Qwen2VLConfig(
+		vocab_size=128,
+		hidden_size=64,
+		intermediate_size=128,
+		num_hidden_layers=1,
+		num_attention_heads=4,
+		num_key_value_heads=2,
+		max_position_embeddings=64,
+		vision_config=dict(vision_kwargs, depth=1),
+		rope_scaling={"type": "mrope", "mrope_section": [2, 3, 3]},
+		bits=8,
+	)
+	config.attn_mechanism = "vanilla"
+	model = Qwen2VLForConditionalGeneration(config, rngs=nn.Rngs(0))
+	assert type(model.lm_head.dot_general).__name__ == "DotGeneral"
+
+	input_ids = jnp.arange(8)[None] % 100
+	logits = model(input_ids=input_ids, attention_mask=jnp.ones_like(input_ids)).logits
+	assert logits.shape == (1, 8, 128)
+	assert jnp.all(jnp.isfinite(logits))
+
+
+@pytest.mark.parametrize("case", sorted(rope_index_cases))
+def test_get_rope_index(case):
+	"""Test 3D rope positions and deltas of mixed image/video batches."""
+	(
+		input_ids,
+		attention_mask,
+		image_grid_thw,
+		video_grid_thw,
+		expected_position_ids,
+		expected_deltas,
+	) = rope_index_cases[case]
+	position_ids, deltas = get_rope_index(
+		np.array(input_ids),
+		image_grid_thw=np.array(image_grid_thw),
+		video_grid_thw=None if video_grid_thw is None else np.array(video_grid_thw),
+		attention_mask=np.array(attention_mask),
+		spatial_merge_size=2,
+		image_token_id=image_id,
+		video_token_id=video_id,
+		vision_start_token_id=vision_start_id,
+	)
+	np.testing.assert_array_equal(position_ids, np.array(expected_position_ids))
+	np.testing.assert_array_equal(deltas, np.array(expected_deltas))
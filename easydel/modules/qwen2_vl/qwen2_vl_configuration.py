@@ -34,6 +34,7 @@ class Qwen2VLVisionConfig(EasyDeLBaseConfig):
 		patch_size=14,
 		spatial_merge_size=2,
 		temporal_patch_size=2,
+		scan_layers=False,
 		**kwargs,
 	):
 		super().__init__(**kwargs)
@@ -48,6 +49,7 @@ class Qwen2VLVisionConfig(EasyDeLBaseConfig):
 		self.patch_size = patch_size
 		self.spatial_merge_size = spatial_merge_size
 		self.temporal_patch_size = temporal_patch_size
+		self.scan_layers = scan_layers
 
 
 class Qwen2VLConfig(EasyDeLBaseConfig):
@@ -235,6 +237,14 @@ class Qwen2VLConfig(EasyDeLBaseConfig):
 		Returns:
 		    `tp.Tuple[tp.Tuple[str, PartitionSpec]]`: The partition rules.
 		"""
+		# a scanned vision tower stores its blocks as one module with a leading
+		# `depth` axis (no per-block index in the path).
+		vision_scan = getattr(self.vision_config, "scan_layers", False)
+		blocks = "blocks/" if vision_scan else "blocks/.*/"
+
+		def block_spec(*axes):
+			return PartitionSpec(None, *axes) if vision_scan else PartitionSpec(*axes)
+
 		return (
 			# Language model embeddings
 			("embed_tokens/embedding", PartitionSpec("tp", ("fsdp", "sp"))),
@@ -262,18 +272,18 @@ class Qwen2VLConfig(EasyDeLBaseConfig):
 			("patch_embed/proj/kernel", PartitionSpec(None, None, None, None, "tp")),
 			("patch_embed/proj/bias", PartitionSpec(None)),
 			# Visual model attention blocks
-			("blocks/.*/attn/qkv/kernel", PartitionSpec(("fsdp", "sp"), "tp")),
-			("blocks/.*/attn/qkv/bias", PartitionSpec("tp")),
-			("blocks/.*/attn/proj/kernel", PartitionSpec("tp", ("fsdp", "sp"))),
-			("blocks/.*/attn/proj/bias", PartitionSpec("tp")),
+			(f"{blocks}attn/qkv/kernel", block_spec(("fsdp", "sp"), "tp")),
+			(f"{blocks}attn/qkv/bias", block_spec("tp")),
+			(f"{blocks}attn/proj/kernel", block_spec("tp", ("fsdp", "sp"))),
+			(f"{blocks}attn/proj/bias", block_spec("tp")),
 			# Visual model MLP blocks
-			("blocks/.*/mlp/fc1/kernel", PartitionSpec(("fsdp", "sp"), "tp")),
-			("blocks/.*/mlp/fc1/bias", PartitionSpec("tp")),
-			("blocks/.*/mlp/fc2/kernel", PartitionSpec("tp", ("fsdp", "sp"))),
-			("blocks/.*/mlp/fc2/bias", PartitionSpec("tp")),
+			(f"{blocks}mlp/fc1/kernel", block_spec(("fsdp", "sp"), "tp")),
+			(f"{blocks}mlp/fc1/bias", block_spec("tp")),
+			(f"{blocks}mlp/fc2/kernel", block_spec("tp", ("fsdp", "sp"))),
+			(f"{blocks}mlp/fc2/bias", block_spec("tp")),
 			# Visual model norms
-			("blocks/.*/norm1/(bias|scale)", PartitionSpec(None)),
-			("blocks/.*/norm2/(bias|scale)", PartitionSpec(None)),
+			(f"{blocks}norm1/(bias|scale)", block_spec(None)),
+			(f"{blocks}norm2/(bias|scale)", block_spec(None)),
 			# Visual model merger
 			("merger/ln_q/(bias|scale)", PartitionSpec(None)),
 			("merger/mlp/.*/kernel", PartitionSpec(("fsdp", "sp"), "tp")),
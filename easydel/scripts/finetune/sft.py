@@ -128,6 +128,18 @@ def main():
 		runtime_config.dataset_name,
 		split=runtime_config.dataset_split,
 	)
+	# render the chat template once up front on `dataset_num_proc` workers, so the
+	# trainer only tokenizes plain text.
+	dataset = dataset.map(
+		lambda batch: {
+			sft_config.dataset_text_field: processor.apply_chat_template(
+				batch[sft_config.dataset_text_field],
+				tokenize=False,
+			)
+		},
+		batched=True,
+		num_proc=sft_config.dataset_num_proc,
+	)
 
 	# Initialize model
 	model = ed.AutoEasyDeLModelForCausalLM.from_pretrained(
@@ -156,9 +168,6 @@ def main():
 		arguments=sft_config,
 		train_dataset=dataset,
 		processing_class=processor,
-		formatting_func=lambda x: processor.apply_chat_template(
-			x[sft_config.dataset_text_field], tokenize=False
-		),
 	)
 
 	trainer.train()
@@ -246,7 +246,7 @@ class SFTTrainer(Trainer):
 				return_length=False,
 			)
 
-			if formatting_func is not None and not isinstance(formatting_func(element), list):
+			if formatting_func is not None and not isinstance(inputs, list):
 				raise ValueError(
 					"The `formatting_func` should return a list of processed strings since it can lead to silent bugs."
 				)